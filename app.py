@@ -5,17 +5,28 @@ A Flask app for optimizing delivery routes in Lima, Peru.
 """
 
 import functools
+import gzip
+import hashlib
 import json
 import os
 import re
 import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
+import orjson
 import requests
 from dotenv import load_dotenv
-from flask import Flask, render_template_string, request, jsonify, Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, request, Response
+
+from cache import cache_get, cache_get_many, cache_set, cache_set_many
+from urls import SHORT_URL_RE, find_place_or_center, resolve_short_url
 
 load_dotenv()
 
@@ -23,15 +34,58 @@ app = Flask(__name__)
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 ROUTES_API_URL = "https://routes.googleapis.com/directions/v2:computeRoutes"
+ROUTE_MATRIX_API_URL = "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix"
+
+# Routes API limit on intermediate waypoints when optimizeWaypointOrder is set
+ROUTES_MAX_WAYPOINTS = 25
+
+# Routes with up to this many stops are ordered locally from cached leg distances
+# (the exact search takes about 40 ms at 12 stops and doubles with each one added)
+LOCAL_ROUTE_MAX_WAYPOINTS = 12
+# Road distances barely change, so legs are kept for a week; durations are
+# never cached here, they come live from the Routes API
+ROUTE_DISTANCES_TTL = 7 * 24 * 3600  # seconds
+
+# Reverse geocoded addresses are cached per ~10m cell (coords rounded to 4 decimals)
+REVERSE_GEOCODE_TTL = 30 * 24 * 3600  # seconds
 
 # Bsale API configuration
 BSALE_ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 BSALE_API_URL = "https://api.bsale.io/v1"
 
+# Shared HTTP session: reuses TCP/TLS connections across Google and Bsale calls
+# Pool is sized for GEOCODE_POOL fan-out; transient 502/503/504s are retried
+# (urllib3 only retries idempotent methods on bad status, so POSTs are never resent)
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
+# Worker threads for fanning out independent API calls (e.g. reverse geocoding)
+GEOCODE_POOL = ThreadPoolExecutor(max_workers=16)
+
 # Basic Auth credentials from environment
 AUTH_USERNAME = os.getenv("AUTH_USERNAME", "admin")
 AUTH_PASSWORD = os.getenv("AUTH_PASSWORD", "admin")
 
+# Google Maps URL coordinate patterns (place pin and map center are in urls.py)
+QUERY_COORDS_RE = re.compile(r"(-?\d+\.?\d*),\s*(-?\d+\.?\d*)")
+PATH_COORDS_RE = re.compile(r"/(-?\d+\.?\d*),(-?\d+\.?\d*)")
+
+# Apartment/office details that confuse geocoding ("Dpto 301", "Oficina 502", "Int. 5")
+APARTMENT_RE = re.compile(
+    r',?\s*(Dpto\.?|Departamento|Oficina|Dpto/Oficina|Dept\.?|Int\.?|Piso|Torre)\s*[A-Za-z0-9\-]+',
+    re.IGNORECASE
+)
+
+# Page markup, read once at import (it is static, no Jinja rendering needed)
+# Kept out of static/ so the page stays behind basic auth
+INDEX_HTML = (Path(__file__).parent / "templates" / "index.html").read_bytes()
+INDEX_HTML_GZIP = gzip.compress(INDEX_HTML, compresslevel=9)
+INDEX_ETAG = hashlib.md5(INDEX_HTML).hexdigest()
+
 # Client cache file path
 CLIENTS_CACHE_FILE = Path(__file__).parent / "clients_cache.json"
 
@@ -44,6 +98,22 @@ CLIENTS_CACHE = {
     "total_count": 0,
     "last_updated": None
 }
+# Guards CLIENTS_CACHE updates made from background loader threads
+CLIENTS_CACHE_LOCK = threading.Lock()
+
+# Serialized /api/clients response, rebuilt only when CLIENTS_CACHE changes
+CLIENTS_PAYLOAD = {}
+
+# Each open /api/clients/stream holds a gunicorn thread, so streams end after
+# this long; the page reconnects if loading is still in progress
+CLIENTS_STREAM_MAX_SECONDS = 30
+
+# Routes API response cache: key -> (expires_at, response), least recently used first
+# Backed by the persistent "routes" namespace; short TTL keeps traffic-aware results fresh
+ROUTES_CACHE = OrderedDict()
+ROUTES_CACHE_MAX_SIZE = 512
+ROUTES_CACHE_TTL = 300  # seconds
+ROUTES_CACHE_LOCK = threading.Lock()
 
 # Sync progress tracking for Google Sheets sync
 SYNC_STATE = {
@@ -83,28 +153,36 @@ def requires_auth(f):
     return decorated
 
 
+def json_response(data, status=200) -> Response:
+    """Serialize data with orjson (much faster than jsonify on large lists)."""
+    return Response(orjson.dumps(data), status=status, mimetype='application/json')
+
+
 def extract_coords_from_url(url: str) -> tuple[float, float] | None:
     """Extract latitude and longitude from various Google Maps URL formats."""
     url = url.strip()
     
-    if "goo.gl" in url or "maps.app" in url:
+    # Short links resolve through a bounded in-process cache backed by the
+    # persistent "short_urls" namespace
+    if SHORT_URL_RE.match(url):
         try:
-            response = requests.head(url, allow_redirects=True, timeout=10)
-            url = response.url
+            url = resolve_short_url(url)
         except requests.RequestException:
             return None
     
-    # Pattern 1: !3d and !4d format (actual place coordinates in data parameter)
-    place_lat = re.search(r'!3d(-?\d+\.?\d*)', url)
-    place_lng = re.search(r'!4d(-?\d+\.?\d*)', url)
-    if place_lat and place_lng:
-        return float(place_lat.group(1)), float(place_lng.group(1))
-    
-    # Pattern 2: Coordinates in @ format (map view center - fallback)
-    at_pattern = r"@(-?\d+\.?\d*),(-?\d+\.?\d*)"
-    match = re.search(at_pattern, url)
-    if match:
-        return float(match.group(1)), float(match.group(2))
+    return parse_coords_from_url(url)
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_coords_from_url(url: str) -> tuple[float, float] | None:
+    """
+    Parse coordinates out of a full Google Maps URL (no network access).
+    Memoized since the same start/end links are pasted over and over.
+    """
+    # Patterns 1 and 2: !3d/!4d place coordinates, else the @ map center
+    coords = find_place_or_center(url)
+    if coords:
+        return coords
     
     # Pattern 3: Coordinates in query parameter
     parsed = urlparse(url)
@@ -112,14 +190,12 @@ def extract_coords_from_url(url: str) -> tuple[float, float] | None:
     
     if "q" in query_params:
         q_value = query_params["q"][0]
-        coord_pattern = r"(-?\d+\.?\d*),\s*(-?\d+\.?\d*)"
-        match = re.search(coord_pattern, q_value)
+        match = QUERY_COORDS_RE.search(q_value)
         if match:
             return float(match.group(1)), float(match.group(2))
     
     # Pattern 4: Coordinates in the path
-    path_pattern = r"/(-?\d+\.?\d*),(-?\d+\.?\d*)"
-    match = re.search(path_pattern, parsed.path)
+    match = PATH_COORDS_RE.search(parsed.path)
     if match:
         return float(match.group(1)), float(match.group(2))
     
@@ -133,27 +209,104 @@ def extract_coords_from_url(url: str) -> tuple[float, float] | None:
     return None
 
 
+def make_waypoint(coords):
+    """Build a Routes API waypoint from (lat, lng)."""
+    return {
+        "location": {
+            "latLng": {
+                "latitude": coords[0],
+                "longitude": coords[1]
+            }
+        }
+    }
+
+
+def round_coords(point) -> tuple[float, float]:
+    """Round (lat, lng) to 4 decimals, a ~10m cell used for cache keys and dedupe."""
+    return (round(point[0], 4), round(point[1], 4))
+
+
+def route_cache_key(origin, destination, waypoints):
+    """
+    Build a cache key that ignores waypoint order and ~10m coordinate noise.
+    Returns (key, order), where order[k] is the input index of the k-th
+    waypoint in canonical (sorted) order.
+    """
+    order = sorted(range(len(waypoints)), key=lambda i: round_coords(waypoints[i]))
+    canonical = [round_coords(origin), round_coords(destination), [round_coords(waypoints[i]) for i in order]]
+    key = hashlib.blake2b(
+        json.dumps(canonical, separators=(',', ':')).encode(), digest_size=16
+    ).hexdigest()
+    return key, order
+
+
 def optimize_route(origin, destination, waypoints):
-    """Use Google Routes API to compute the optimal route order."""
+    """
+    Use Google Routes API to compute the optimal route order.
+    Successful responses are cached for ROUTES_CACHE_TTL seconds under a
+    canonical key, so resubmitting the same stops in any order is a cache hit.
+    """
     if not GOOGLE_API_KEY:
         return {"error": "API key not configured"}
     
-    def make_waypoint(coords):
-        return {
-            "location": {
-                "latLng": {
-                    "latitude": coords[0],
-                    "longitude": coords[1]
-                }
-            }
-        }
+    cache_key, order = route_cache_key(origin, destination, waypoints)
+    
+    result = get_cached_route(cache_key)
+    if result is None:
+        # Query in canonical order so the cached response is valid for any input order
+        result = request_route(origin, destination, [waypoints[i] for i in order], optimize_order=True)
+        if "error" in result:
+            return result
+        
+        store_route(cache_key, result)
+    
+    return remap_route_order(result, order)
+
+
+def get_cached_route(cache_key):
+    """
+    Look up a canonical-order route response, in memory first, then in the
+    persistent "routes" namespace. Returns None on a miss.
+    """
+    with ROUTES_CACHE_LOCK:
+        cached = ROUTES_CACHE.get(cache_key)
+        if cached and cached[0] > time.time():
+            ROUTES_CACHE.move_to_end(cache_key)
+            return cached[1]
     
+    result = cache_get("routes", cache_key)
+    if result is not None:
+        remember_route(cache_key, result)
+    return result
+
+
+def store_route(cache_key, result):
+    """Cache a canonical-order route response for ROUTES_CACHE_TTL seconds."""
+    cache_set("routes", cache_key, result, ttl=ROUTES_CACHE_TTL)
+    remember_route(cache_key, result)
+
+
+def remember_route(cache_key, result):
+    """Keep a route response in the in-memory LRU, evicting the oldest entries."""
+    with ROUTES_CACHE_LOCK:
+        ROUTES_CACHE[cache_key] = (time.time() + ROUTES_CACHE_TTL, result)
+        ROUTES_CACHE.move_to_end(cache_key)
+        while len(ROUTES_CACHE) > ROUTES_CACHE_MAX_SIZE:
+            ROUTES_CACHE.popitem(last=False)
+
+
+def request_route(origin, destination, waypoints, optimize_order):
+    """
+    Call the Routes API for a traffic-aware route through waypoints.
+    With optimize_order the API also picks the waypoint order; otherwise
+    waypoints are visited as given. Returns the parsed response or {"error": ...}.
+    """
     request_body = {
         "origin": make_waypoint(origin),
         "destination": make_waypoint(destination),
-        "intermediates": [make_waypoint(wp) for wp in waypoints],
+        "intermediates": [make_waypoint(w) for w in waypoints],
         "travelMode": "DRIVE",
-        "optimizeWaypointOrder": True,
+        "optimizeWaypointOrder": optimize_order,
         "routingPreference": "TRAFFIC_AWARE",
         "computeAlternativeRoutes": False,
         "languageCode": "es",
@@ -167,19 +320,196 @@ def optimize_route(origin, destination, waypoints):
     }
     
     try:
-        response = requests.post(ROUTES_API_URL, json=request_body, headers=headers, timeout=30)
+        response = HTTP_SESSION.post(ROUTES_API_URL, data=orjson.dumps(request_body), headers=headers, timeout=30)
         response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return orjson.loads(response.content)
+    except (requests.RequestException, orjson.JSONDecodeError) as e:
         return {"error": str(e)}
 
 
+def remap_route_order(result, order):
+    """Translate a canonical-order Routes response back to the caller's waypoint indices."""
+    routes = result.get("routes")
+    if not routes:
+        return result
+    
+    route = dict(routes[0])
+    canonical_order = route.get("optimizedIntermediateWaypointIndex", list(range(len(order))))
+    route["optimizedIntermediateWaypointIndex"] = [order[k] for k in canonical_order]
+    return {**result, "routes": [route, *routes[1:]]}
+
+
+def compute_route_matrix(origins, destinations):
+    """
+    Get driving distance between every origin and destination using the
+    Routes API Route Matrix endpoint (without traffic, the cheaper tier).
+    Returns the list of matrix elements, or None on error.
+    """
+    request_body = {
+        "origins": [{"waypoint": make_waypoint(o)} for o in origins],
+        "destinations": [{"waypoint": make_waypoint(d)} for d in destinations],
+        "travelMode": "DRIVE",
+        "routingPreference": "TRAFFIC_UNAWARE",
+    }
+    
+    headers = {
+        "Content-Type": "application/json",
+        "X-Goog-Api-Key": GOOGLE_API_KEY,
+        "X-Goog-FieldMask": "originIndex,destinationIndex,distanceMeters,condition",
+    }
+    
+    try:
+        response = HTTP_SESSION.post(ROUTE_MATRIX_API_URL, data=orjson.dumps(request_body), headers=headers, timeout=30)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    except (requests.RequestException, orjson.JSONDecodeError) as e:
+        print(f"Error calling Route Matrix API: {e}")
+        return None
+
+
+def get_route_distances(points):
+    """
+    Get the driving distance in meters for every leg a route through points
+    could use. points[0] is the origin and points[-1] the destination, so legs
+    never end at the origin or start at the destination.
+    
+    Distances are cached by coordinates; only legs not seen before are requested
+    from the Route Matrix API. Returns {(from_index, to_index): meters},
+    or None if the matrix could not be fetched or some leg has no route.
+    """
+    def leg_key(a, b):
+        return f"{a[0]},{a[1]}|{b[0]},{b[1]}"
+    
+    last = len(points) - 1
+    keys = {
+        (i, j): leg_key(points[i], points[j])
+        for i in range(last)
+        for j in range(1, last + 1)
+        if i != j
+    }
+    
+    known = cache_get_many("route_distances", list(set(keys.values())))
+    
+    # Request full rows for origins with any unknown leg
+    missing_from = sorted({i for (i, j), key in keys.items() if key not in known})
+    if missing_from:
+        elements = compute_route_matrix([points[i] for i in missing_from], points[1:])
+        if elements is None:
+            return None
+        
+        fetched = {}
+        for element in elements:
+            if element.get("condition") != "ROUTE_EXISTS":
+                continue
+            # Zero-valued fields are omitted from the API's JSON output
+            i = missing_from[element.get("originIndex", 0)]
+            j = element.get("destinationIndex", 0) + 1
+            if i == j:
+                continue
+            fetched[leg_key(points[i], points[j])] = element.get("distanceMeters", 0)
+        
+        cache_set_many("route_distances", fetched, ttl=ROUTE_DISTANCES_TTL)
+        known.update(fetched)
+    
+    distances = {}
+    for pair, key in keys.items():
+        if key not in known:
+            return None
+        distances[pair] = known[key]
+    return distances
+
+
+def solve_route_order(distances, waypoint_count):
+    """
+    Find the waypoint order with the shortest total driving distance (Held-Karp).
+    Node 0 is the origin, 1..waypoint_count the waypoints and waypoint_count + 1
+    the destination. Returns waypoint indices (0-based) in visiting order.
+    """
+    n = waypoint_count
+    destination = n + 1
+    cost = [[distances.get((i, j), 0) for j in range(n + 2)] for i in range(n + 1)]
+    
+    full = (1 << n) - 1
+    best = [[float("inf")] * n for _ in range(full + 1)]
+    parent = [[-1] * n for _ in range(full + 1)]
+    
+    for k in range(n):
+        best[1 << k][k] = cost[0][k + 1]
+    
+    for mask in range(1, full + 1):
+        best_mask = best[mask]
+        for last in range(n):
+            current = best_mask[last]
+            if current == float("inf"):
+                continue
+            from_costs = cost[last + 1]
+            for nxt in range(n):
+                bit = 1 << nxt
+                if mask & bit:
+                    continue
+                candidate = current + from_costs[nxt + 1]
+                if candidate < best[mask | bit][nxt]:
+                    best[mask | bit][nxt] = candidate
+                    parent[mask | bit][nxt] = last
+    
+    last = min(range(n), key=lambda k: best[full][k] + cost[k + 1][destination])
+    
+    order = []
+    mask = full
+    while last >= 0:
+        order.append(last)
+        mask, last = mask & ~(1 << last), parent[mask][last]
+    order.reverse()
+    return order
+
+
+def plan_route(origin, destination, waypoints):
+    """
+    Compute the optimal route order, solving small routes locally.
+    
+    Routes with up to LOCAL_ROUTE_MAX_WAYPOINTS stops are ordered with an exact
+    search over cached leg distances, which only needs a Route Matrix request
+    for unseen legs. The Routes API then times that order with live traffic.
+    The timed response is cached like optimize_route's (same canonical key and
+    short TTL), so repeat routes cost no API calls and ETAs stay fresh.
+    Larger routes, or any failure, fall back to the Routes API optimizer.
+    
+    Returns a response shaped like the Routes API's (see optimize_route).
+    """
+    if GOOGLE_API_KEY and 0 < len(waypoints) <= LOCAL_ROUTE_MAX_WAYPOINTS:
+        cache_key, order = route_cache_key(origin, destination, waypoints)
+        result = get_cached_route(cache_key)
+        
+        if result is None:
+            # Solve in canonical order so the cached response is valid for any input order
+            canonical = [waypoints[i] for i in order]
+            distances = get_route_distances([origin] + canonical + [destination])
+            if distances is not None:
+                local_order = solve_route_order(distances, len(canonical))
+                timed = request_route(origin, destination, [canonical[i] for i in local_order], optimize_order=False)
+                if timed.get("routes"):
+                    route = dict(timed["routes"][0])
+                    route["optimizedIntermediateWaypointIndex"] = local_order
+                    result = {**timed, "routes": [route]}
+                    store_route(cache_key, result)
+        
+        if result is not None:
+            return remap_route_order(result, order)
+    
+    return optimize_route(origin, destination, waypoints)
+
+
 def generate_google_maps_url(origin, destination, ordered_waypoints):
     """Generate a Google Maps directions URL."""
-    base_url = "https://www.google.com/maps/dir/"
-    points = [origin] + ordered_waypoints + [destination]
-    path_parts = [f"{lat},{lng}" for lat, lng in points]
-    return base_url + "/".join(path_parts)
+    # Coords may arrive as lists (e.g. from the JSON cache), so make them hashable
+    points = tuple(tuple(point) for point in (origin, *ordered_waypoints, destination))
+    return build_directions_url(points)
+
+
+@functools.lru_cache(maxsize=256)
+def build_directions_url(points: tuple[tuple[float, float], ...]) -> str:
+    """Join (lat, lng) points into a directions URL (memoized per route)."""
+    return "https://www.google.com/maps/dir/" + "/".join(f"{lat},{lng}" for lat, lng in points)
 
 
 def generate_split_routes(origin, destination, ordered_waypoints, max_waypoints_per_route=8):
@@ -255,39 +585,119 @@ def reverse_geocode(coords: tuple[float, float]) -> str:
     if not GOOGLE_API_KEY:
         return f"{coords[0]:.6f}, {coords[1]:.6f}"
     
+    try:
+        return lookup_address(*round_coords(coords))
+    except (requests.RequestException, orjson.JSONDecodeError, LookupError):
+        return f"{coords[0]:.6f}, {coords[1]:.6f}"
+
+
+def reverse_geocode_batch(points: list[tuple[float, float]]) -> list[str]:
+    """
+    Reverse geocode many points at once.
+    Points are deduped per ~10m cell, cached addresses come from a single
+    persistent-cache read, and only the misses hit the API (concurrently).
+    """
+    if not GOOGLE_API_KEY:
+        return [reverse_geocode(point) for point in points]
+    
+    # First point seen in each cell stands in for the whole cell
+    cells = {}
+    for point in points:
+        cells.setdefault(round_coords(point), point)
+    
+    cached = cache_get_many("reverse_geocode", [f"{lat:.4f},{lng:.4f}" for lat, lng in cells])
+    addresses = {}
+    missing = []
+    for cell in cells:
+        address = cached.get(f"{cell[0]:.4f},{cell[1]:.4f}")
+        if address:
+            addresses[cell] = address
+        else:
+            missing.append(cell)
+    
+    # Misses were just checked, so go straight to the API and write back once
+    def fetch(cell):
+        try:
+            return fetch_address(*cell)
+        except (requests.RequestException, orjson.JSONDecodeError, LookupError):
+            return None
+    
+    fetched = {}
+    for cell, address in zip(missing, GEOCODE_POOL.map(fetch, missing)):
+        if address:
+            fetched[f"{cell[0]:.4f},{cell[1]:.4f}"] = address
+            addresses[cell] = address
+        else:
+            point = cells[cell]
+            addresses[cell] = f"{point[0]:.6f}, {point[1]:.6f}"
+    cache_set_many("reverse_geocode", fetched, ttl=REVERSE_GEOCODE_TTL)
+    
+    return [addresses[round_coords(point)] for point in points]
+
+
+@functools.lru_cache(maxsize=8192)
+def lookup_address(lat: float, lng: float) -> str:
+    """
+    Reverse geocode coordinates already rounded to a ~10m cell.
+    Memoized in-process in front of the persistent cache; failures raise
+    instead of returning, so they are never memoized.
+    """
+    cache_key = f"{lat:.4f},{lng:.4f}"
+    address = cache_get("reverse_geocode", cache_key)
+    if address:
+        return address
+    
+    address = fetch_address(lat, lng)
+    cache_set("reverse_geocode", cache_key, address, ttl=REVERSE_GEOCODE_TTL)
+    return address
+
+
+def fetch_address(lat: float, lng: float) -> str:
+    """
+    Reverse geocode coordinates with the Geocoding API (no caching).
+    Raises on network errors or when no address is found.
+    """
     url = "https://maps.googleapis.com/maps/api/geocode/json"
     params = {
-        "latlng": f"{coords[0]},{coords[1]}",
+        "latlng": f"{lat},{lng}",
         "key": GOOGLE_API_KEY,
         "language": "es",
         "result_type": "street_address|route|neighborhood|locality"
     }
     
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get("status") == "OK" and data.get("results"):
-            return data["results"][0].get("formatted_address", f"{coords[0]:.6f}, {coords[1]:.6f}")
-        return f"{coords[0]:.6f}, {coords[1]:.6f}"
-    except requests.RequestException:
-        return f"{coords[0]:.6f}, {coords[1]:.6f}"
+    response = HTTP_SESSION.get(url, params=params, timeout=10)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    
+    if data.get("status") == "OK" and data.get("results"):
+        address = data["results"][0].get("formatted_address")
+        if address:
+            return address
+    raise LookupError(f"No address for {lat:.4f},{lng:.4f}: {data.get('status')}")
 
 
+def parse_duration(duration: str) -> int:
+    """Parse a Routes API duration string like "1234s" into seconds."""
+    return int(duration[:-1]) if duration else 0
+
+
+@functools.lru_cache(maxsize=1024)
 def format_duration(seconds):
     """Format seconds into human-readable duration."""
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
+    hours, remainder = divmod(seconds, 3600)
+    minutes = remainder // 60
     if hours > 0:
         return f"{hours}h {minutes}min"
     return f"{minutes}min"
 
 
+@functools.lru_cache(maxsize=1024)
 def format_distance(meters):
     """Format meters into human-readable distance."""
     if meters >= 1000:
-        return f"{meters / 1000:.1f} km"
+        # Integer rounding to tenths of a km (avoids float division and %.1f)
+        km, tenths = divmod((meters + 50) // 100, 10)
+        return f"{km}.{tenths} km"
     return f"{meters} m"
 
 
@@ -297,11 +707,7 @@ def geocode_address(address: str, city: str = "", district: str = "") -> tuple[f
         return None
     
     # Clean address: remove apartment/office info that confuses geocoding
-    # Common patterns: "Dpto 301", "Dpto/Oficina 301", "Oficina 502", "Dept. 101", "Int. 5"
-    import re
-    clean_address = address
-    # Remove apartment/office patterns
-    clean_address = re.sub(r',?\s*(Dpto\.?|Departamento|Oficina|Dpto/Oficina|Dept\.?|Int\.?|Piso|Torre)\s*[A-Za-z0-9\-]+', '', clean_address, flags=re.IGNORECASE)
+    clean_address = APARTMENT_RE.sub('', address)
     clean_address = clean_address.strip().rstrip(',').strip()
     
     # Build full address string with district for accuracy (e.g., "San Isidro", "Miraflores")
@@ -321,18 +727,36 @@ def geocode_address(address: str, city: str = "", district: str = "") -> tuple[f
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = HTTP_SESSION.get(url, params=params, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
         if data.get("status") == "OK" and data.get("results"):
             location = data["results"][0]["geometry"]["location"]
             return (location["lat"], location["lng"])
         return None
-    except requests.RequestException:
+    except (requests.RequestException, orjson.JSONDecodeError):
         return None
 
 
+def geocode_client(client_id, address: str, city: str = "", district: str = "") -> tuple[float, float] | None:
+    """
+    Geocode a client's address, reusing coordinates cached by client ID.
+    The cached entry is ignored if the client's address, city or district changed.
+    """
+    cache_key = str(client_id)
+    address_key = f"{address}|{city}|{district}"
+    
+    cached = cache_get("client_coords", cache_key)
+    if cached and cached.get("address") == address_key:
+        return tuple(cached["coords"])
+    
+    coords = geocode_address(address, city, district)
+    if coords:
+        cache_set("client_coords", cache_key, {"address": address_key, "coords": coords})
+    return coords
+
+
 def fetch_bsale_clients() -> list[dict]:
     """Get clients from in-memory cache."""
     return CLIENTS_CACHE["clients"]
@@ -350,9 +774,10 @@ def load_clients_from_file() -> list[dict]:
             data = json.load(f)
             clients = data.get("clients", [])
             last_updated = data.get("last_updated")
-            CLIENTS_CACHE["clients"] = clients
-            CLIENTS_CACHE["loaded"] = True
-            CLIENTS_CACHE["last_updated"] = last_updated
+            with CLIENTS_CACHE_LOCK:
+                CLIENTS_CACHE["clients"] = clients
+                CLIENTS_CACHE["loaded"] = True
+                CLIENTS_CACHE["last_updated"] = last_updated
             print(f"Loaded {len(clients)} clients from cache file (updated: {last_updated})")
             return clients
     except (json.JSONDecodeError, IOError) as e:
@@ -379,16 +804,17 @@ def fetch_bsale_clients_from_api() -> list[dict]:
     """Fetch clients from Bsale API and update cache."""
     global CLIENTS_CACHE
     
-    if CLIENTS_CACHE["loading"]:
-        print("Already loading clients, skipping...")
-        return CLIENTS_CACHE["clients"]
-    
     if not BSALE_ACCESS_TOKEN:
         print("BSALE_ACCESS_TOKEN not configured")
         return []
     
-    CLIENTS_CACHE["loading"] = True
-    CLIENTS_CACHE["loading_progress"] = 0
+    # Check and claim the loading flag atomically so only one thread fetches
+    with CLIENTS_CACHE_LOCK:
+        if CLIENTS_CACHE["loading"]:
+            print("Already loading clients, skipping...")
+            return CLIENTS_CACHE["clients"]
+        CLIENTS_CACHE["loading"] = True
+        CLIENTS_CACHE["loading_progress"] = 0
     
     clients = []
     offset = 0
@@ -401,14 +827,14 @@ def fetch_bsale_clients_from_api() -> list[dict]:
     
     try:
         while True:
-            response = requests.get(
+            response = HTTP_SESSION.get(
                 f"{BSALE_API_URL}/clients.json",
                 headers=headers,
                 params={"limit": limit, "offset": offset, "state": 0},
                 timeout=30
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             total_count = data.get("count", 0)
             items = data.get("items", [])
@@ -442,16 +868,17 @@ def fetch_bsale_clients_from_api() -> list[dict]:
         print(f"Total Bsale clients fetched: {len(clients)}")
         
         # Update in-memory cache
-        CLIENTS_CACHE["clients"] = clients
-        CLIENTS_CACHE["loaded"] = True
-        CLIENTS_CACHE["loading_progress"] = total_count
-        CLIENTS_CACHE["last_updated"] = datetime.now().isoformat()
+        with CLIENTS_CACHE_LOCK:
+            CLIENTS_CACHE["clients"] = clients
+            CLIENTS_CACHE["loaded"] = True
+            CLIENTS_CACHE["loading_progress"] = total_count
+            CLIENTS_CACHE["last_updated"] = datetime.now().isoformat()
         
         # Save to file
         save_clients_to_file(clients)
         
         return clients
-    except requests.RequestException as e:
+    except (requests.RequestException, orjson.JSONDecodeError) as e:
         print(f"Error fetching Bsale clients: {e}")
         if hasattr(e, 'response') and e.response is not None:
             print(f"Response content: {e.response.text}")
@@ -498,3010 +925,173 @@ def preload_clients():
     thread.start()
 
 
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>MiuRuta - Optimizador de Rutas</title>
-    <link rel="icon" type="image/png" href="/static/miushop-logo.png">
-    <link rel="apple-touch-icon" href="/static/miushop-logo.png">
-    <link href="https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;500;700&family=Plus+Jakarta+Sans:wght@300;400;500;600;700;800&display=swap" rel="stylesheet">
-    <style>
-        :root {
-            /* Adoptamiu Pink Theme 🐱 */
-            --bg-base: #fff5f7;
-            --bg-surface: #ffffff;
-            --bg-elevated: #fef1f3;
-            --bg-hover: #fde4e8;
-            --accent-primary: #e91e63;
-            --accent-secondary: #f48fb1;
-            --accent-success: #4caf50;
-            --accent-warning: #ff9800;
-            --accent-error: #f44336;
-            --text-primary: #2d2d2d;
-            --text-secondary: #666666;
-            --text-muted: #999999;
-            --border-subtle: rgba(233, 30, 99, 0.1);
-            --border-default: rgba(233, 30, 99, 0.25);
-            --glow-primary: rgba(233, 30, 99, 0.12);
-            --glow-secondary: rgba(244, 143, 177, 0.15);
-        }
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        html {
-            scroll-behavior: smooth;
-        }
-        
-        body {
-            font-family: 'Plus Jakarta Sans', -apple-system, BlinkMacSystemFont, sans-serif;
-            background: var(--bg-base);
-            color: var(--text-primary);
-            min-height: 100vh;
-            overflow-x: hidden;
-        }
-        
-        /* Soft pink background with subtle pattern */
-        .bg-pattern {
-            position: fixed;
-            inset: 0;
-            z-index: -1;
-            background: 
-                radial-gradient(ellipse 100% 60% at 50% -10%, rgba(244, 143, 177, 0.25), transparent),
-                radial-gradient(ellipse 80% 50% at 100% 100%, rgba(233, 30, 99, 0.08), transparent),
-                radial-gradient(ellipse 60% 40% at 0% 80%, rgba(244, 143, 177, 0.12), transparent);
-        }
-        
-        .grid-overlay {
-            position: fixed;
-            inset: 0;
-            z-index: -1;
-            /* Subtle paw print pattern overlay */
-            opacity: 0.03;
-            background-image: url("data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='60' height='60' viewBox='0 0 60 60'%3E%3Cpath fill='%23e91e63' d='M30 25c-2.5 0-4.5 2-4.5 4.5s2 4.5 4.5 4.5 4.5-2 4.5-4.5-2-4.5-4.5-4.5zm-8-4c-1.5 0-3 1.5-3 3s1.5 3 3 3 3-1.5 3-3-1.5-3-3-3zm16 0c-1.5 0-3 1.5-3 3s1.5 3 3 3 3-1.5 3-3-1.5-3-3-3zm-12 10c-1.5 0-3 1.5-3 3s1.5 3 3 3 3-1.5 3-3-1.5-3-3-3zm8 0c-1.5 0-3 1.5-3 3s1.5 3 3 3 3-1.5 3-3-1.5-3-3-3z'/%3E%3C/svg%3E");
-            background-size: 60px 60px;
-        }
-        
-        /* Layout */
-        .app-container {
-            max-width: 1000px;
-            margin: 0 auto;
-            padding: 32px 24px 60px;
-        }
-        
-        /* Header */
-        .app-header {
-            text-align: center;
-            margin-bottom: 48px;
-            padding-top: 20px;
-        }
-        
-        .logo {
-            display: inline-flex;
-            align-items: center;
-            gap: 12px;
-            margin-bottom: 16px;
-        }
-        
-        .logo-icon {
-            width: 56px;
-            height: 56px;
-            background: linear-gradient(135deg, #f8bbd9, #f48fb1);
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 28px;
-            box-shadow: 0 4px 20px rgba(233, 30, 99, 0.2);
-            border: 3px solid white;
-        }
-        
-        .logo-text {
-            font-family: 'Plus Jakarta Sans', sans-serif;
-            font-size: 2.2rem;
-            font-weight: 800;
-            background: linear-gradient(135deg, #e91e63, #f48fb1);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }
-        
-        .tagline {
-            color: var(--text-secondary);
-            font-size: 1.1rem;
-            font-weight: 400;
-            max-width: 500px;
-            margin: 0 auto;
-            line-height: 1.6;
-        }
-        
-        /* Cards */
-        .card {
-            background: var(--bg-surface);
-            border: 2px solid var(--border-subtle);
-            border-radius: 24px;
-            padding: 28px;
-            margin-bottom: 20px;
-            box-shadow: 0 4px 20px rgba(233, 30, 99, 0.06);
-            transition: all 0.3s ease;
-        }
-        
-        .card:hover {
-            border-color: var(--border-default);
-            box-shadow: 0 8px 30px rgba(233, 30, 99, 0.1);
-        }
-        
-        .card-bsale {
-            position: relative;
-            z-index: 100;
-        }
-        
-        .card-header {
-            display: flex;
-            align-items: center;
-            gap: 12px;
-            margin-bottom: 24px;
-        }
-        
-        .card-icon {
-            width: 44px;
-            height: 44px;
-            background: linear-gradient(135deg, #fce4ec, #f8bbd9);
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 20px;
-        }
-        
-        .card-title {
-            font-size: 0.75rem;
-            font-weight: 600;
-            text-transform: uppercase;
-            letter-spacing: 1.5px;
-            color: var(--text-secondary);
-            flex: 1;
+@app.route('/')
+@requires_auth
+def index():
+    response = Response(INDEX_HTML, mimetype='text/html')
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(INDEX_HTML_GZIP)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(INDEX_ETAG + "-gzip")
+    else:
+        response.set_etag(INDEX_ETAG)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Browser-only caching (the page is behind basic auth), revalidated via ETag
+    response.headers['Cache-Control'] = 'private, max-age=300, must-revalidate'
+    return response.make_conditional(request)
+
+
+def get_clients_status() -> dict:
+    """Get the Bsale client cache status (everything but the client list)."""
+    return {
+        "loading": CLIENTS_CACHE["loading"],
+        "loaded": CLIENTS_CACHE["loaded"],
+        "count": len(CLIENTS_CACHE["clients"]),
+        "progress": CLIENTS_CACHE["loading_progress"],
+        "total": CLIENTS_CACHE["total_count"],
+        "last_updated": CLIENTS_CACHE["last_updated"]
+    }
+
+
+def get_clients_payload() -> dict:
+    """
+    Get the serialized /api/clients body, its gzip form and ETag.
+    Only re-serializes when the client list or cache status has changed.
+    """
+    global CLIENTS_PAYLOAD
+    
+    status = get_clients_status()
+    # The client list is replaced, never mutated, when the cache reloads
+    version = (id(CLIENTS_CACHE["clients"]), tuple(status.values()))
+    if CLIENTS_PAYLOAD.get("version") != version:
+        status["clients"] = CLIENTS_CACHE["clients"]
+        body = orjson.dumps(status)
+        CLIENTS_PAYLOAD = {
+            "version": version,
+            "body": body,
+            "gzip": gzip.compress(body, compresslevel=6),
+            "etag": hashlib.md5(body).hexdigest()
         }
-        
-        .refresh-btn {
-            background: rgba(244, 143, 177, 0.2);
-            border: 1px solid rgba(233, 30, 99, 0.25);
-            border-radius: 50%;
-            padding: 8px;
-            cursor: pointer;
-            transition: all 0.2s ease;
-            font-size: 0.9rem;
-            line-height: 1;
-            width: 36px;
-            height: 36px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-        }
-        
-        .refresh-btn:hover {
-            background: rgba(244, 143, 177, 0.35);
-            border-color: var(--accent-primary);
-        }
-        
-        .refresh-btn.loading .refresh-icon {
-            display: inline-block;
-            animation: spin 1s linear infinite;
-        }
-        
-        @keyframes spin {
-            from { transform: rotate(0deg); }
-            to { transform: rotate(360deg); }
-        }
-        
-        .cache-status {
-            font-size: 0.75rem;
-            color: var(--text-muted);
-            margin-bottom: 16px;
-            display: flex;
-            align-items: center;
-            gap: 6px;
-        }
-        
-        .cache-status .status-dot {
-            width: 6px;
-            height: 6px;
-            border-radius: 50%;
-            background: var(--accent-success);
-        }
-        
-        .cache-status.loading .status-dot {
-            background: var(--accent-warning);
-            animation: pulse 1s ease-in-out infinite;
-        }
-        
-        .cache-status.syncing .status-dot {
-            background: var(--accent-primary);
-            animation: pulse 1s ease-in-out infinite;
-        }
-        
-        @keyframes pulse {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0.4; }
-        }
-        
-        /* Sync progress bar */
-        .sync-progress-container {
-            width: 100%;
-            margin-top: 8px;
-            display: none;
-        }
-        
-        .sync-progress-container.active {
-            display: block;
-        }
-        
-        .sync-progress-bar {
-            width: 100%;
-            height: 6px;
-            background: rgba(0, 0, 0, 0.05);
-            border-radius: 3px;
-            overflow: hidden;
-        }
-        
-        .sync-progress-fill {
-            height: 100%;
-            background: linear-gradient(90deg, var(--accent-primary), var(--accent-secondary));
-            border-radius: 3px;
-            transition: width 0.3s ease;
-            width: 0%;
-        }
-        
-        .sync-progress-text {
-            font-size: 0.7rem;
-            color: var(--text-muted);
-            margin-top: 4px;
-            text-align: center;
-        }
-        
-        /* Form elements */
-        .input-row {
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 16px;
-        }
-        
-        @media (max-width: 640px) {
-            .input-row {
-                grid-template-columns: 1fr;
-            }
-        }
-        
-        .input-group {
-            margin-bottom: 20px;
-        }
-        
-        .input-group:last-child {
-            margin-bottom: 0;
-        }
-        
-        .input-label {
-            display: flex;
-            align-items: center;
-            gap: 8px;
-            font-size: 0.85rem;
-            font-weight: 500;
-            color: var(--text-secondary);
-            margin-bottom: 10px;
-        }
-        
-        .input-label-icon {
-            font-size: 14px;
-        }
-        
-        .input-field {
-            width: 100%;
-            padding: 16px 18px;
-            background: #fef7f9;
-            border: 2px solid var(--border-subtle);
-            border-radius: 16px;
-            color: var(--text-primary);
-            font-family: 'Plus Jakarta Sans', sans-serif;
-            font-size: 0.9rem;
-            transition: all 0.2s ease;
-        }
-        
-        .input-field::placeholder {
-            color: var(--text-muted);
-        }
-        
-        .input-field:hover {
-            border-color: var(--border-default);
-        }
-        
-        .input-field:focus {
-            outline: none;
-            border-color: var(--accent-primary);
-            box-shadow: 0 0 0 4px var(--glow-primary);
-        }
-        
-        textarea.input-field {
-            min-height: 160px;
-            resize: vertical;
-            line-height: 1.7;
-        }
-        
-        .input-hint {
-            display: flex;
-            align-items: center;
-            gap: 6px;
-            font-size: 0.75rem;
-            color: var(--text-muted);
-            margin-top: 8px;
-        }
-        
-        .input-prefilled {
-            border-color: rgba(233, 30, 99, 0.3);
-            background: rgba(233, 30, 99, 0.05);
-        }
-        
-        .prefilled-label {
-            display: inline-block;
-            margin-top: 8px;
-            padding: 6px 12px;
-            background: rgba(233, 30, 99, 0.1);
-            border: 1px solid rgba(233, 30, 99, 0.25);
-            border-radius: 20px;
-            font-size: 0.8rem;
-            font-weight: 600;
-            color: var(--accent-primary);
-        }
-        
-        .quick-fill-btn {
-            display: inline-flex;
-            align-items: center;
-            gap: 6px;
-            margin-top: 8px;
-            padding: 8px 14px;
-            background: rgba(244, 143, 177, 0.2);
-            border: 1px solid rgba(233, 30, 99, 0.25);
-            border-radius: 20px;
-            font-size: 0.8rem;
-            font-weight: 600;
-            color: var(--accent-primary);
-            cursor: pointer;
-            transition: all 0.2s ease;
-            font-family: inherit;
-        }
-        
-        .quick-fill-btn:hover {
-            background: rgba(244, 143, 177, 0.35);
-            border-color: var(--accent-primary);
-        }
-        
-        .quick-fill-btn.active {
-            background: rgba(233, 30, 99, 0.15);
-            border-color: rgba(233, 30, 99, 0.4);
-            color: var(--accent-primary);
-        }
-        
-        /* Buttons */
-        .btn {
-            display: inline-flex;
-            align-items: center;
-            justify-content: center;
-            gap: 10px;
-            padding: 18px 32px;
-            font-family: 'Plus Jakarta Sans', sans-serif;
-            font-size: 1rem;
-            font-weight: 600;
-            border: none;
-            border-radius: 14px;
-            cursor: pointer;
-            transition: all 0.25s ease;
-            text-decoration: none;
-        }
-        
-        .btn-primary {
-            width: 100%;
-            background: linear-gradient(135deg, #e91e63, #f48fb1);
-            color: white;
-            box-shadow: 0 4px 20px rgba(233, 30, 99, 0.3);
-        }
-        
-        .btn-primary:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 8px 30px rgba(233, 30, 99, 0.4);
-        }
-        
-        .btn-primary:active {
-            transform: translateY(-1px);
-        }
-        
-        .btn-primary:disabled {
-            background: linear-gradient(135deg, #ccc, #ddd);
-            color: #999;
-            cursor: not-allowed;
-            box-shadow: none;
-            transform: none;
-        }
-        
-        .btn-primary:disabled:hover {
-            transform: none;
-            box-shadow: none;
-        }
-        
-        .unverified-warning {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 6px;
-            margin-top: 12px;
-            padding: 10px 16px;
-            background: rgba(255, 152, 0, 0.1);
-            border: 1px solid rgba(255, 152, 0, 0.3);
-            border-radius: 10px;
-            color: #e65100;
-            font-size: 0.85rem;
-            text-align: center;
-        }
-        
-        .btn-secondary {
-            background: white;
-            color: var(--accent-primary);
-            border: 2px solid var(--border-default);
-        }
-        
-        .btn-secondary:hover {
-            background: var(--bg-hover);
-            border-color: var(--border-default);
-        }
-        
-        .btn-maps {
-            background: linear-gradient(135deg, #4285f4, #34a853);
-            color: white;
-            box-shadow: 0 4px 20px rgba(66, 133, 244, 0.3);
-        }
-        
-        .btn-maps:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 8px 40px rgba(66, 133, 244, 0.4);
-        }
-        
-        /* Route parts for multi-route */
-        .route-parts-notice {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 8px;
-            padding: 12px 16px;
-            background: rgba(66, 133, 244, 0.1);
-            border: 1px solid rgba(66, 133, 244, 0.2);
-            border-radius: 12px;
-            color: #1a73e8;
-            font-size: 0.9rem;
-            margin-bottom: 12px;
-        }
-        
-        .route-parts-buttons {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 10px;
-            justify-content: center;
-        }
-        
-        .route-part-btn {
-            flex: 1;
-            min-width: 140px;
-            max-width: 200px;
-        }
-        
-        /* Route Summary Section */
-        .route-summary-section {
-            margin-top: 24px;
-            padding: 20px;
-            background: linear-gradient(135deg, #fff5f8 0%, #ffeef3 100%);
-            border-radius: 16px;
-            border: 2px solid rgba(236, 72, 153, 0.15);
-        }
-        
-        .route-summary-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 16px;
-        }
-        
-        .route-summary-header h3 {
-            font-size: 1.1rem;
-            font-weight: 600;
-            color: var(--primary-dark);
-            margin: 0;
-        }
-        
-        .route-summary-input-row {
-            display: flex;
-            gap: 12px;
-            align-items: center;
-            margin-bottom: 12px;
-        }
-        
-        .route-summary-input-row label {
-            font-size: 0.85rem;
-            font-weight: 500;
-            color: var(--text-secondary);
-            white-space: nowrap;
-        }
-        
-        .route-summary-input-row input {
-            flex: 1;
-            padding: 10px 14px;
-            border: 2px solid #e5e5e5;
-            border-radius: 10px;
-            font-size: 0.95rem;
-            font-family: inherit;
-            font-weight: 600;
-            color: var(--primary-dark);
-        }
-        
-        .route-summary-input-row input:focus {
-            outline: none;
-            border-color: var(--primary);
-        }
-        
-        .route-summary-text {
-            width: 100%;
-            min-height: 280px;
-            padding: 16px;
-            border: 2px solid #e5e5e5;
-            border-radius: 12px;
-            font-family: 'SF Mono', 'Monaco', 'Inconsolata', monospace;
-            font-size: 0.9rem;
-            line-height: 1.6;
-            resize: vertical;
-            background: white;
-            color: #333;
-            box-sizing: border-box;
-        }
-        
-        .route-summary-text:focus {
-            outline: none;
-            border-color: var(--primary);
-        }
-        
-        .btn-copy {
-            display: flex;
-            align-items: center;
-            gap: 6px;
-            padding: 10px 16px;
-            background: white;
-            border: 2px solid var(--primary);
-            color: var(--primary);
-            border-radius: 12px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: all 0.2s;
-        }
-        
-        .btn-copy:hover {
-            background: var(--primary);
-            color: white;
-        }
-        
-        .btn-copy.copied {
-            background: #10b981;
-            border-color: #10b981;
-            color: white;
-        }
-        
-        /* Results */
-        #results {
-            display: none;
-        }
-        
-        .results-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: flex-start;
-            flex-wrap: wrap;
-            gap: 24px;
-            margin-bottom: 32px;
-            padding-bottom: 24px;
-            border-bottom: 1px solid var(--border-subtle);
-        }
-        
-        .results-title {
-            font-size: 1.5rem;
-            font-weight: 700;
-            color: var(--text-primary);
-        }
-        
-        .results-subtitle {
-            font-size: 0.9rem;
-            color: var(--text-muted);
-            margin-top: 4px;
-        }
-        
-        .stats-grid {
-            display: flex;
-            gap: 32px;
-        }
-        
-        .stat-item {
-            text-align: right;
-        }
-        
-        .stat-value {
-            font-family: 'JetBrains Mono', monospace;
-            font-size: 1.75rem;
-            font-weight: 700;
-            background: linear-gradient(135deg, var(--accent-primary), var(--accent-success));
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }
-        
-        .stat-label {
-            font-size: 0.7rem;
-            font-weight: 600;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-            color: var(--text-muted);
-            margin-top: 2px;
-        }
-        
-        /* Timeline */
-        .timeline {
-            position: relative;
-            padding-left: 36px;
-        }
-        
-        .timeline::before {
-            content: '';
-            position: absolute;
-            left: 11px;
-            top: 24px;
-            bottom: 24px;
-            width: 2px;
-            background: linear-gradient(180deg, 
-                #e91e63 0%, 
-                #f48fb1 50%, 
-                #4caf50 100%);
-            border-radius: 2px;
-        }
-        
-        .timeline-item {
-            position: relative;
-            padding: 20px 0;
-            border-bottom: 1px solid var(--border-subtle);
-        }
-        
-        .timeline-item:last-child {
-            border-bottom: none;
-        }
-        
-        .timeline-marker {
-            position: absolute;
-            left: -36px;
-            top: 24px;
-            width: 24px;
-            height: 24px;
-            border-radius: 50%;
-            background: var(--bg-surface);
-            border: 3px solid var(--accent-secondary);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 10px;
-            font-weight: 700;
-            color: var(--accent-secondary);
-        }
-        
-        .timeline-item.start .timeline-marker {
-            background: #e91e63;
-            border-color: #e91e63;
-            color: white;
-            box-shadow: 0 0 15px rgba(233, 30, 99, 0.3);
-        }
-        
-        .timeline-item.end .timeline-marker {
-            background: #4caf50;
-            border-color: #4caf50;
-            color: white;
-            box-shadow: 0 0 15px rgba(76, 175, 80, 0.3);
-        }
-        
-        .timeline-content {
-            display: flex;
-            justify-content: space-between;
-            align-items: flex-start;
-            gap: 16px;
-        }
-        
-        .timeline-info {
-            flex: 1;
-        }
-        
-        .timeline-label {
-            font-size: 0.7rem;
-            font-weight: 600;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-            color: var(--text-muted);
-            margin-bottom: 6px;
-        }
-        
-        .timeline-item.start .timeline-label,
-        .timeline-item.end .timeline-label {
-            color: var(--accent-primary);
-        }
-        
-        .timeline-address {
-            font-size: 1rem;
-            font-weight: 500;
-            color: var(--text-primary);
-            line-height: 1.5;
-            margin-bottom: 4px;
-        }
-        
-        .timeline-coords {
-            font-family: 'JetBrains Mono', monospace;
-            font-size: 0.7rem;
-            color: var(--text-muted);
-        }
-        
-        .timeline-metrics {
-            text-align: right;
-            flex-shrink: 0;
-        }
-        
-        .metric-distance {
-            font-family: 'JetBrains Mono', monospace;
-            font-size: 0.9rem;
-            font-weight: 600;
-            color: var(--accent-primary);
-        }
-        
-        .metric-time {
-            font-size: 0.8rem;
-            color: var(--text-secondary);
-            margin-top: 2px;
-        }
-        
-        /* Action buttons */
-        .action-row {
-            display: flex;
-            gap: 12px;
-            margin-top: 28px;
-        }
-        
-        .action-row .btn {
-            flex: 1;
-        }
-        
-        @media (max-width: 500px) {
-            .action-row {
-                flex-direction: column;
-            }
-        }
-        
-        /* Loading */
-        .loading-container {
-            display: none;
-            text-align: center;
-            padding: 60px 20px;
-        }
-        
-        .loading-container.active {
-            display: block;
-        }
-        
-        .loader {
-            width: 56px;
-            height: 56px;
-            margin: 0 auto 20px;
-            border-radius: 50%;
-            border: 3px solid var(--border-subtle);
-            border-top-color: var(--accent-primary);
-            animation: spin 1s linear infinite;
-        }
-        
-        @keyframes spin {
-            to { transform: rotate(360deg); }
-        }
-        
-        .loading-text {
-            color: var(--text-secondary);
-            font-size: 1rem;
-        }
-        
-        /* Errors */
-        .error-banner {
-            background: rgba(248, 113, 113, 0.1);
-            border: 1px solid rgba(248, 113, 113, 0.3);
-            border-radius: 12px;
-            padding: 16px 20px;
-            color: var(--accent-error);
-            font-size: 0.9rem;
-            margin-top: 16px;
-        }
-        
-        /* Bsale Client Selector */
-        .client-selector {
-            position: relative;
-        }
-        
-        .client-search {
-            width: 100%;
-            padding: 16px 18px;
-            padding-right: 45px;
-            background: var(--bg-base);
-            border: 1px solid var(--border-subtle);
-            border-radius: 12px;
-            color: var(--text-primary);
-            font-family: 'Plus Jakarta Sans', sans-serif;
-            font-size: 0.95rem;
-            transition: all 0.2s ease;
-        }
-        
-        .client-search::placeholder {
-            color: var(--text-muted);
-        }
-        
-        .client-search:focus {
-            outline: none;
-            border-color: var(--accent-secondary);
-            box-shadow: 0 0 0 4px var(--glow-secondary);
-        }
-        
-        .client-dropdown {
-            position: absolute;
-            top: 100%;
-            left: 0;
-            right: 0;
-            max-height: 320px;
-            overflow-y: auto;
-            background: white;
-            border: 2px solid var(--border-default);
-            border-radius: 16px;
-            margin-top: 8px;
-            z-index: 9999;
-            display: none;
-            box-shadow: 0 10px 40px rgba(233, 30, 99, 0.15);
-        }
-        
-        .client-dropdown.active {
-            display: block;
-        }
-        
-        .client-option {
-            padding: 14px 18px;
-            cursor: pointer;
-            border-bottom: 1px solid var(--border-subtle);
-            transition: background 0.15s;
-        }
-        
-        .client-option:last-child {
-            border-bottom: none;
-        }
-        
-        .client-option:hover,
-        .client-option.highlighted {
-            background: var(--bg-hover);
-        }
-        
-        .client-option.highlighted {
-            outline: 2px solid var(--accent-primary);
-            outline-offset: -2px;
-        }
-        
-        .client-option.selected {
-            background: rgba(233, 30, 99, 0.1);
-        }
-        
-        .client-name {
-            font-weight: 600;
-            color: var(--text-primary);
-            margin-bottom: 4px;
-        }
-        
-        .client-address {
-            font-size: 0.8rem;
-            color: var(--text-secondary);
-        }
-        
-        .client-code {
-            font-family: 'JetBrains Mono', monospace;
-            font-size: 0.7rem;
-            color: var(--text-muted);
-            margin-top: 2px;
-        }
-        
-        .selected-clients {
-            display: flex;
-            flex-direction: column;
-            gap: 8px;
-            margin-top: 12px;
-        }
-        
-        .selected-clients:empty {
-            display: none;
-        }
-        
-        .client-tag {
-            display: inline-flex;
-            align-items: center;
-            gap: 6px;
-            padding: 10px 14px;
-            background: white;
-            border: 1px solid var(--border-default);
-            border-radius: 12px;
-            font-size: 0.9rem;
-            color: var(--text-primary);
-            box-shadow: 0 2px 8px rgba(0,0,0,0.04);
-        }
-        
-        .client-tag-info {
-            display: flex;
-            flex-direction: column;
-            gap: 2px;
-            flex: 1;
-            min-width: 0;
-        }
-        
-        .client-tag-name {
-            font-weight: 500;
-        }
-        
-        .client-tag-address {
-            font-size: 0.8rem;
-            color: var(--text-muted);
-            white-space: nowrap;
-            overflow: hidden;
-            text-overflow: ellipsis;
-        }
-        
-        .client-tag-phone {
-            font-size: 0.75rem;
-            color: var(--text-muted);
-        }
-        
-        .client-tag-phone a {
-            color: var(--text-secondary);
-            text-decoration: none;
-        }
-        
-        .client-tag-phone a:hover {
-            color: var(--accent-primary);
-            text-decoration: underline;
-        }
-        
-        .client-tag-status {
-            width: 8px;
-            height: 8px;
-            border-radius: 50%;
-            flex-shrink: 0;
-        }
-        
-        .client-tag-status.verified {
-            background: #4caf50;
-        }
-        
-        .client-tag-status.unverified {
-            background: #ff9800;
-        }
-        
-        .client-tag-actions {
-            display: flex;
-            align-items: center;
-            gap: 2px;
-            margin-left: 4px;
-            padding-left: 8px;
-            border-left: 1px solid var(--border-subtle);
-        }
-        
-        .client-tag-btn {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            width: 32px;
-            height: 32px;
-            background: var(--bg-elevated);
-            border: 1px solid var(--border-subtle);
-            cursor: pointer;
-            border-radius: 8px;
-            font-size: 1rem;
-            transition: all 0.15s;
-        }
-        
-        .client-tag-btn:hover {
-            background: var(--bg-hover);
-            border-color: var(--border-default);
-            transform: scale(1.05);
-        }
-        
-        .client-tag-btn.maps-btn:hover {
-            background: rgba(66, 133, 244, 0.1);
-            border-color: rgba(66, 133, 244, 0.3);
-        }
-        
-        .client-tag-btn.verify-btn {
-            background: rgba(76, 175, 80, 0.1);
-            border-color: rgba(76, 175, 80, 0.2);
-            color: #2e7d32;
-        }
-        
-        .client-tag-btn.verify-btn:hover {
-            background: rgba(76, 175, 80, 0.2);
-            border-color: rgba(76, 175, 80, 0.4);
-        }
-        
-        .client-tag-btn.verify-btn.confirming {
-            background: #4caf50;
-            border-color: #4caf50;
-            color: white;
-            animation: pulse-green 0.8s infinite;
-        }
-        
-        @keyframes pulse-green {
-            0%, 100% { box-shadow: 0 0 0 0 rgba(76, 175, 80, 0.4); }
-            50% { box-shadow: 0 0 0 6px rgba(76, 175, 80, 0); }
-        }
-        
-        .client-tag-btn.fix-btn {
-            background: rgba(255, 152, 0, 0.1);
-            border-color: rgba(255, 152, 0, 0.2);
-            color: #e65100;
-        }
-        
-        .client-tag-btn.fix-btn:hover {
-            background: rgba(255, 152, 0, 0.2);
-            border-color: rgba(255, 152, 0, 0.4);
-        }
-        
-        .client-tag-remove {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            width: 24px;
-            height: 24px;
-            background: none;
-            border: none;
-            color: var(--text-muted);
-            cursor: pointer;
-            font-size: 1.2rem;
-            line-height: 1;
-            border-radius: 4px;
-            opacity: 0.4;
-            transition: all 0.15s;
-            margin-left: 8px;
-        }
-        
-        .client-tag-remove:hover {
-            opacity: 1;
-            color: var(--accent-error);
-        }
-        
-        /* Verification status - green border for verified */
-        .client-tag.verified {
-            border-color: rgba(76, 175, 80, 0.4);
-            border-left: 3px solid #4caf50;
-        }
-        
-        .client-tag.unverified {
-            border-color: rgba(255, 152, 0, 0.4);
-            border-left: 3px solid #ff9800;
-        }
-        
-        /* Compact verification badge for dropdown */
-        .verification-badge {
-            font-size: 0.65rem;
-            padding: 2px 5px;
-            border-radius: 8px;
-            font-weight: 600;
-            margin-left: 6px;
-        }
-        
-        .verification-badge.verified {
-            background: rgba(76, 175, 80, 0.15);
-            color: #2e7d32;
-        }
-        
-        .verification-badge.unverified {
-            background: rgba(255, 152, 0, 0.15);
-            color: #e65100;
-        }
-        
-        /* Info tooltip */
-        .info-tooltip {
-            position: relative;
-            display: inline-flex;
-            align-items: center;
-            justify-content: center;
-            width: 20px;
-            height: 20px;
-            background: var(--bg-elevated);
-            border: 1px solid var(--border-default);
-            border-radius: 50%;
-            font-size: 0.7rem;
-            color: var(--text-muted);
-            cursor: help;
-            margin-left: 8px;
-        }
-        
-        .info-tooltip-content {
-            position: absolute;
-            bottom: calc(100% + 10px);
-            left: 50%;
-            transform: translateX(-50%);
-            width: 320px;
-            padding: 16px;
-            background: white;
-            border: 1px solid var(--border-default);
-            border-radius: 12px;
-            box-shadow: 0 10px 40px rgba(0,0,0,0.15);
-            font-size: 0.85rem;
-            line-height: 1.5;
-            color: var(--text-secondary);
-            opacity: 0;
-            visibility: hidden;
-            transition: all 0.2s;
-            z-index: 100;
-        }
-        
-        .info-tooltip-content::after {
-            content: '';
-            position: absolute;
-            top: 100%;
-            left: 50%;
-            transform: translateX(-50%);
-            border: 8px solid transparent;
-            border-top-color: white;
-        }
-        
-        .info-tooltip:hover .info-tooltip-content {
-            opacity: 1;
-            visibility: visible;
-        }
-        
-        .info-tooltip-content h4 {
-            font-size: 0.9rem;
-            font-weight: 600;
-            color: var(--text-primary);
-            margin-bottom: 8px;
-        }
-        
-        .info-tooltip-content ul {
-            margin: 8px 0;
-            padding-left: 16px;
-        }
-        
-        .info-tooltip-content li {
-            margin: 4px 0;
-        }
-        
-        .info-tooltip-content .badge-demo {
-            display: inline-flex;
-            align-items: center;
-            gap: 4px;
-            padding: 2px 6px;
-            border-radius: 6px;
-            font-size: 0.75rem;
-            font-weight: 500;
-        }
-        
-        .info-tooltip-content .badge-demo.green {
-            background: rgba(76, 175, 80, 0.15);
-            color: #2e7d32;
-        }
-        
-        .info-tooltip-content .badge-demo.orange {
-            background: rgba(255, 152, 0, 0.15);
-            color: #e65100;
-        }
-        
-        /* Client verification actions - simplified */
-        .client-actions {
-            display: none;
-        }
-        
-        .client-action-btn {
-            background: none;
-            border: none;
-            cursor: pointer;
-            padding: 4px;
-            border-radius: 4px;
-            font-size: 0.9rem;
-            opacity: 0.7;
-            transition: all 0.15s;
-        }
-        
-        .client-action-btn:hover {
-            opacity: 1;
-            background: rgba(233, 30, 99, 0.1);
-        }
-        
-        .client-action-btn.verify-btn:hover {
-            background: rgba(76, 175, 80, 0.15);
-        }
-        
-        .client-action-btn.fix-btn:hover {
-            background: rgba(255, 152, 0, 0.15);
-        }
-        
-        /* Verify confirmation popup */
-        .verify-popup-overlay {
-            position: fixed;
-            inset: 0;
-            background: rgba(0, 0, 0, 0.4);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            z-index: 1001;
-            animation: fadeIn 0.15s ease-out;
-        }
-        
-        @keyframes fadeIn {
-            from { opacity: 0; }
-            to { opacity: 1; }
-        }
-        
-        .verify-popup {
-            background: white;
-            border-radius: 20px;
-            padding: 28px;
-            max-width: 360px;
-            width: 90%;
-            text-align: center;
-            box-shadow: 0 20px 60px rgba(0, 0, 0, 0.2);
-            animation: slideUp 0.2s ease-out;
-        }
-        
-        @keyframes slideUp {
-            from { opacity: 0; transform: translateY(20px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        
-        .verify-popup-icon {
-            width: 56px;
-            height: 56px;
-            background: linear-gradient(135deg, #4caf50, #81c784);
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            margin: 0 auto 16px;
-            font-size: 1.5rem;
-            color: white;
-        }
-        
-        .verify-popup h3 {
-            font-size: 1.2rem;
-            font-weight: 600;
-            margin-bottom: 8px;
-            color: var(--text-primary);
-        }
-        
-        .verify-popup p {
-            margin: 4px 0;
-            color: var(--text-secondary);
-            font-size: 0.95rem;
-        }
-        
-        .verify-popup-note {
-            margin-top: 12px !important;
-            font-size: 0.85rem !important;
-            color: var(--text-muted) !important;
-            line-height: 1.4;
-        }
-        
-        .verify-popup-hint {
-            font-size: 0.8rem !important;
-            color: var(--text-muted) !important;
-            font-style: italic;
-            margin-top: 8px !important;
-        }
-        
-        .verify-popup-wide {
-            max-width: 450px;
-            text-align: left;
-        }
-        
-        .verify-popup-wide h3 {
-            text-align: center;
-        }
-        
-        .verify-popup-wide > p:first-of-type {
-            text-align: center;
-        }
-        
-        .verify-popup-fields {
-            margin: 16px 0;
-        }
-        
-        .verify-popup-fields label {
-            display: block;
-            font-size: 0.85rem;
-            font-weight: 500;
-            color: var(--text-secondary);
-            margin-bottom: 6px;
-            margin-top: 12px;
-        }
-        
-        .verify-popup-fields label:first-child {
-            margin-top: 0;
-        }
-        
-        .verify-popup-fields input,
-        .verify-popup-fields textarea {
-            width: 100%;
-            padding: 10px 12px;
-            border: 2px solid #e5e5e5;
-            border-radius: 10px;
-            font-size: 0.95rem;
-            font-family: inherit;
-            transition: border-color 0.2s;
-            box-sizing: border-box;
-        }
-        
-        .verify-popup-fields input:focus,
-        .verify-popup-fields textarea:focus {
-            outline: none;
-            border-color: var(--primary);
-        }
-        
-        .verify-popup-fields textarea {
-            resize: vertical;
-            min-height: 70px;
-        }
-        
-        .verify-popup-actions {
-            display: flex;
-            gap: 12px;
-            margin-top: 20px;
-        }
-        
-        .verify-popup-btn {
-            flex: 1;
-            padding: 12px 16px;
-            border-radius: 12px;
-            font-weight: 500;
-            font-size: 0.95rem;
-            cursor: pointer;
-            transition: all 0.15s;
-        }
-        
-        .verify-popup-btn.cancel {
-            background: var(--bg-elevated);
-            border: 1px solid var(--border-default);
-            color: var(--text-secondary);
-        }
-        
-        .verify-popup-btn.cancel:hover {
-            background: var(--bg-hover);
-        }
-        
-        .verify-popup-btn.confirm {
-            background: linear-gradient(135deg, #4caf50, #66bb6a);
-            border: none;
-            color: white;
-        }
-        
-        .verify-popup-btn.confirm:hover {
-            transform: translateY(-1px);
-            box-shadow: 0 4px 15px rgba(76, 175, 80, 0.3);
-        }
-        
-        /* Fix address modal */
-        .modal-overlay {
-            position: fixed;
-            inset: 0;
-            background: rgba(0, 0, 0, 0.5);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            z-index: 1000;
-            opacity: 0;
-            visibility: hidden;
-            transition: all 0.2s;
-        }
-        
-        .modal-overlay.active {
-            opacity: 1;
-            visibility: visible;
-        }
-        
-        .modal-content {
-            background: white;
-            border-radius: 20px;
-            padding: 28px;
-            max-width: 500px;
-            width: 90%;
-            box-shadow: 0 20px 60px rgba(0, 0, 0, 0.2);
-        }
-        
-        .modal-content-wide {
-            max-width: 520px;
-        }
-        
-        .modal-bsale-address {
-            font-size: 0.9rem;
-            color: var(--text-muted);
-            margin-bottom: 16px;
-            padding: 10px;
-            background: #f8f8f8;
-            border-radius: 8px;
-        }
-        
-        .modal-field {
-            margin-bottom: 14px;
-        }
-        
-        .modal-field label {
-            display: block;
-            font-size: 0.85rem;
-            font-weight: 500;
-            color: var(--text-secondary);
-            margin-bottom: 6px;
-        }
-        
-        .modal-field textarea {
-            resize: vertical;
-            min-height: 70px;
-            font-family: inherit;
-        }
-        
-        .modal-title {
-            font-size: 1.2rem;
-            font-weight: 600;
-            margin-bottom: 16px;
-            color: var(--text-primary);
-        }
-        
-        .modal-body {
-            margin-bottom: 20px;
-        }
-        
-        .modal-body p {
-            margin-bottom: 12px;
-            color: var(--text-secondary);
-            font-size: 0.9rem;
-        }
-        
-        .modal-input {
-            width: 100%;
-            padding: 12px 16px;
-            border: 2px solid var(--border-default);
-            border-radius: 12px;
-            font-size: 0.95rem;
-        }
-        
-        .modal-input:focus {
-            outline: none;
-            border-color: var(--accent-primary);
-            box-shadow: 0 0 0 4px var(--glow-primary);
-        }
-        
-        .modal-actions {
-            display: flex;
-            gap: 12px;
-            justify-content: flex-end;
-        }
-        
-        .modal-btn {
-            padding: 10px 20px;
-            border-radius: 10px;
-            font-weight: 500;
-            cursor: pointer;
-            transition: all 0.15s;
-        }
-        
-        .modal-btn-cancel {
-            background: var(--bg-elevated);
-            border: 1px solid var(--border-default);
-            color: var(--text-secondary);
-        }
-        
-        .modal-btn-cancel:hover {
-            background: var(--bg-hover);
-        }
-        
-        .modal-btn-save {
-            background: linear-gradient(135deg, var(--accent-primary), var(--accent-secondary));
-            border: none;
-            color: white;
-        }
-        
-        .modal-btn-save:hover {
-            transform: translateY(-1px);
-            box-shadow: 0 4px 15px rgba(233, 30, 99, 0.3);
-        }
-        
-        .no-clients {
-            padding: 20px;
-            text-align: center;
-            color: var(--text-muted);
-            font-size: 0.9rem;
-        }
-        
-        .loading-clients {
-            padding: 20px;
-            text-align: center;
-            color: var(--text-secondary);
-        }
-        
-        .loading-clients .mini-spinner {
-            width: 20px;
-            height: 20px;
-            border: 2px solid rgba(233, 30, 99, 0.2);
-            border-top-color: #e91e63;
-            border-radius: 50%;
-            animation: spin 0.8s linear infinite;
-            display: inline-block;
-            margin-right: 8px;
-            vertical-align: middle;
-        }
-        
-        .progress-container {
-            margin-top: 12px;
-            padding: 0 4px;
-        }
-        
-        .progress-bar {
-            width: 100%;
-            height: 6px;
-            background: var(--bg-base);
-            border-radius: 3px;
-            overflow: hidden;
-        }
-        
-        .progress-fill {
-            height: 100%;
-            background: linear-gradient(90deg, #f48fb1, #e91e63);
-            border-radius: 3px;
-            transition: width 0.3s ease;
-        }
-        
-        .progress-text {
-            font-size: 0.75rem;
-            color: var(--text-muted);
-            margin-top: 6px;
-            text-align: center;
-            font-family: 'JetBrains Mono', monospace;
-        }
-        
-        .loading-label {
-            margin-top: 12px;
-            font-size: 0.85rem;
-            color: var(--text-secondary);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 8px;
-        }
-        
-        .divider {
-            display: flex;
-            align-items: center;
-            gap: 16px;
-            margin: 20px 0;
-            color: var(--text-muted);
-            font-size: 0.8rem;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-        }
-        
-        .divider::before,
-        .divider::after {
-            content: '';
-            flex: 1;
-            height: 1px;
-            background: var(--border-subtle);
-        }
-        
-        /* Footer */
-        .app-footer {
-            text-align: center;
-            padding: 32px 0;
-            color: var(--text-muted);
-            font-size: 0.8rem;
-        }
-        
-        .app-footer a {
-            color: var(--accent-primary);
-            text-decoration: none;
-        }
-        
-        .app-footer a:hover {
-            text-decoration: underline;
-        }
-    </style>
-</head>
-<body>
-    <div class="bg-pattern"></div>
-    <div class="grid-overlay"></div>
-    
-    <div class="app-container">
-        <header class="app-header">
-            <div class="logo">
-                <div class="logo-icon">🐱</div>
-                <span class="logo-text">MiuRuta</span>
-            </div>
-            <p class="tagline">Crea tu ruta de entregas 🐾 <span style="color: var(--text-muted); font-size: 0.9em;">Recuerda verificar las direcciones para mayor precisión</span></p>
-        </header>
-        
-        <main id="form-section">
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">📍</div>
-                    <span class="card-title">Puntos de Inicio y Fin</span>
-                </div>
-                
-                <div class="input-row">
-                    <div class="input-group">
-                        <label class="input-label">
-                            <span class="input-label-icon">🟢</span>
-                            Punto de Inicio
-                        </label>
-                        <input type="text" id="start" class="input-field input-prefilled" value="https://maps.app.goo.gl/mk3h6HRg4Mv7ru3GA" placeholder="Pega el link de Google Maps...">
-                        <span class="prefilled-label">📍 MiuShop</span>
-                    </div>
-                    
-                    <div class="input-group">
-                        <label class="input-label">
-                            <span class="input-label-icon">🏁</span>
-                            Punto Final
-                        </label>
-                        <input type="text" id="end" class="input-field" placeholder="Pega el link de Google Maps...">
-                        <button type="button" class="quick-fill-btn" onclick="setEndToMiuShop()">
-                            <span>🏠</span> Usar MiuShop
-                        </button>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="card card-bsale">
-                <div class="card-header">
-                    <div class="card-icon">👥</div>
-                    <span class="card-title">Clientes</span>
-                    <span class="info-tooltip">?
-                        <div class="info-tooltip-content">
-                            <h4>Sistema de Verificación</h4>
-                            <p>Las direcciones de clientes se geocodifican automáticamente pero pueden tener errores.</p>
-                            <ul>
-                                <li><span class="badge-demo green">●</span> <strong>Verificado</strong> - Dirección confirmada</li>
-                                <li><span class="badge-demo orange">●</span> <strong>Sin verificar</strong> - Requiere revisión</li>
-                            </ul>
-                            <p><strong>Para verificar:</strong></p>
-                            <ul>
-                                <li>🗺️ Abre en Maps para ver ubicación</li>
-                                <li>✓ Si es correcta, marca como verificada</li>
-                                <li>✏️ Si es incorrecta, pega el link correcto</li>
-                            </ul>
-                            <p style="margin-top: 8px; font-size: 0.8rem; color: var(--text-muted);">Los cambios se guardan en Google Sheets.</p>
-                        </div>
-                    </span>
-                    <button type="button" class="refresh-btn" id="refresh-clients-btn" onclick="refreshClients()" title="Sincronizar con Bsale">
-                        <span class="refresh-icon">↻</span>
-                    </button>
-                </div>
-                <div class="cache-status" id="cache-status"></div>
-                <div class="sync-progress-container" id="sync-progress-container">
-                    <div class="sync-progress-bar">
-                        <div class="sync-progress-fill" id="sync-progress-fill"></div>
-                    </div>
-                    <div class="sync-progress-text" id="sync-progress-text"></div>
-                </div>
-                
-                <div class="input-group">
-                    <div class="client-selector">
-                        <input type="text" id="client-search" class="client-search" placeholder="Buscar por nombre, empresa o dirección..." autocomplete="off">
-                        <div class="client-dropdown" id="client-dropdown">
-                            <div class="loading-clients" id="loading-clients">
-                                <span class="mini-spinner"></span>
-                                Cargando clientes...
-                            </div>
-                        </div>
-                    </div>
-                    <div class="selected-clients" id="selected-clients"></div>
-                </div>
-            </div>
-            
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">📦</div>
-                    <span class="card-title">Paradas Adicionales</span>
-                </div>
-                
-                <div class="input-group">
-                    <label class="input-label">
-                        <span class="input-label-icon">🔗</span>
-                        Links de Google Maps (opcional, uno por línea)
-                    </label>
-                    <textarea id="stops" class="input-field" placeholder="https://maps.app.goo.gl/abc123...
-https://maps.app.goo.gl/def456...
-https://maps.app.goo.gl/ghi789..."></textarea>
-                    <p class="input-hint">
-                        <span>💡</span>
-                        Agrega paradas adicionales que no estén en Bsale
-                    </p>
-                </div>
-            </div>
-            
-            <div id="route-button-container">
-                <button class="btn btn-primary" id="optimize-btn" onclick="optimizeRoute()">
-                    <span>⚡</span>
-                    Optimizar Ruta
-                </button>
-                <p class="unverified-warning" id="unverified-warning" style="display: none;">
-                    ⚠️ <span id="unverified-count">0</span> cliente(s) sin verificar. Verifica las direcciones antes de continuar.
-                </p>
-            </div>
-            
-            <div id="error-container"></div>
-        </main>
-        
-        <div class="loading-container" id="loading">
-            <div class="loader"></div>
-            <p class="loading-text">Calculando la ruta más eficiente...</p>
-        </div>
-        
-        <div id="results">
-            <div class="card">
-                <div class="results-header">
-                    <div>
-                        <h2 class="results-title">Ruta Optimizada</h2>
-                        <p class="results-subtitle">El orden más eficiente para tus entregas</p>
-                    </div>
-                    <div class="stats-grid">
-                        <div class="stat-item">
-                            <div class="stat-value" id="total-distance">--</div>
-                            <div class="stat-label">Distancia</div>
-                        </div>
-                        <div class="stat-item">
-                            <div class="stat-value" id="total-time">--</div>
-                            <div class="stat-label">Tiempo</div>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="timeline" id="route-timeline">
-                    <!-- Populated by JS -->
-                </div>
-                
-                <div class="action-row" id="maps-link-container">
-                    <a href="#" class="btn btn-maps" target="_blank">
-                        <span>🗺️</span>
-                        Abrir en Google Maps
-                    </a>
-                </div>
-                
-                <!-- Route Summary for WhatsApp -->
-                <div class="route-summary-section" id="route-summary-section">
-                    <div class="route-summary-header">
-                        <h3>📋 Resumen para WhatsApp</h3>
-                        <button class="btn btn-copy" onclick="copyRouteSummary()">
-                            <span id="copy-icon">📋</span>
-                            <span id="copy-text">Copiar</span>
-                        </button>
-                    </div>
-                    <div class="route-summary-input-row">
-                        <label>Título de la ruta:</label>
-                        <input type="text" id="route-title-input" placeholder="Ej: Ruta 1 / Santi" value="Ruta del día" onchange="updateRouteSummary()">
-                    </div>
-                    <textarea class="route-summary-text" id="route-summary-text" readonly></textarea>
-                </div>
-                
-                <div class="action-row">
-                    <button class="btn btn-secondary" onclick="resetForm()">
-                        <span>↩️</span>
-                        Nueva Ruta
-                    </button>
-                </div>
-            </div>
-        </div>
-        
-        <footer class="app-footer">
-            Powered by <a href="https://developers.google.com/maps/documentation/routes" target="_blank">Google Routes API</a>
-        </footer>
-    </div>
-
-    <script>
-        // Global state
-        let allClients = [];
-        let selectedClients = [];
-        let sheetsAvailable = false;  // Whether Google Sheets is configured
-        let fixingClientId = null;    // Client being fixed in modal
-        let currentRouteData = null;  // Store current route data for summary
-        const MIUSHOP_URL = 'https://maps.app.goo.gl/mk3h6HRg4Mv7ru3GA';
-        
-        function setEndToMiuShop() {
-            const endInput = document.getElementById('end');
-            endInput.value = MIUSHOP_URL;
-            endInput.classList.add('input-prefilled');
-            
-            // Update button to show it's active
-            const btn = event.target.closest('.quick-fill-btn');
-            if (btn) {
-                btn.classList.add('active');
-                btn.innerHTML = '<span>✓</span> MiuShop';
-            }
-        }
-        
-        // Initialize on page load
-        document.addEventListener('DOMContentLoaded', () => {
-            loadClients();
-            setupClientSearch();
-        });
-        
-        // ============ Address Verification Functions ============
-        
-        function openMapsLink(client) {
-            // Open the client's maps link or generate one from address
-            let url = client.maps_link;
-            if (!url && client.address) {
-                // Generate a search URL from address
-                const query = encodeURIComponent(`${client.address}, ${client.district || ''}, ${client.city || ''}, Peru`);
-                url = `https://www.google.com/maps/search/?api=1&query=${query}`;
-            }
-            if (url) {
-                window.open(url, '_blank');
-            }
-        }
-        
-        // Track which clients are in "confirming" state for 2-step verification
-        let confirmingVerification = {};
-        
-        function handleVerifyClick(clientId) {
-            // Show confirmation popup
-            const client = selectedClients.find(c => (c.bsale_id || c.id) == clientId);
-            const clientName = client ? (client.name || `${client.firstName || ''} ${client.lastName || ''}`.trim()) : 'este cliente';
-            
-            showVerifyConfirmPopup(clientId, clientName);
-        }
-        
-        function escapeHtml(str) {
-            if (!str) return '';
-            return str.replace(/&/g, '&amp;')
-                      .replace(/</g, '&lt;')
-                      .replace(/>/g, '&gt;')
-                      .replace(/"/g, '&quot;')
-                      .replace(/'/g, '&#039;')
-                      .replace(/`/g, '&#96;');
-        }
-        
-        function showVerifyConfirmPopup(clientId, clientName) {
-            // Get client details
-            const client = selectedClients.find(c => (c.bsale_id || c.id) == clientId);
-            const bsaleAddress = client ? (client.address || '') : '';
-            const existingCleanAddress = client ? (client.clean_address || '') : '';
-            const existingDistrict = client ? (client.verified_district || client.district || '') : '';
-            
-            // Use existing clean_address or default to bsale address
-            const defaultCleanAddress = existingCleanAddress || bsaleAddress;
-            
-            // Escape values for safe HTML insertion
-            const safeClientName = escapeHtml(clientName);
-            const safeCleanAddress = escapeHtml(defaultCleanAddress);
-            const safeDistrict = escapeHtml(existingDistrict);
-            
-            // Create popup overlay
-            const popup = document.createElement('div');
-            popup.className = 'verify-popup-overlay';
-            popup.innerHTML = `
-                <div class="verify-popup verify-popup-wide">
-                    <div class="verify-popup-icon">✓</div>
-                    <h3>Verificar dirección</h3>
-                    <p><strong>${safeClientName}</strong></p>
-                    
-                    <div class="verify-popup-fields">
-                        <label>Dirección formateada (para WhatsApp):</label>
-                        <textarea id="verify-clean-address" rows="3" placeholder="Ej: Av. Benavides 4331&#10;Piso 3B">${safeCleanAddress}</textarea>
-                        
-                        <label>Distrito:</label>
-                        <input type="text" id="verify-district" value="${safeDistrict}" placeholder="Ej: San Isidro, Miraflores">
-                    </div>
-                    
-                    <p class="verify-popup-note">Al verificar confirmas que la ubicación es correcta. Edita el formato de la dirección para que aparezca bien en el resumen de ruta.</p>
-                    
-                    <div class="verify-popup-actions">
-                        <button class="verify-popup-btn cancel" onclick="closeVerifyPopup()">Cancelar</button>
-                        <button class="verify-popup-btn confirm" onclick="confirmVerifyWithAddress(${clientId})">✓ Verificar</button>
-                    </div>
-                </div>
-            `;
-            document.body.appendChild(popup);
-            
-            // Close on overlay click
-            popup.addEventListener('click', (e) => {
-                if (e.target === popup) closeVerifyPopup();
-            });
-        }
-        
-        async function confirmVerifyWithAddress(clientId) {
-            const cleanAddress = document.getElementById('verify-clean-address').value.trim();
-            const verifiedDistrict = document.getElementById('verify-district').value.trim();
-            
-            closeVerifyPopup();
-            
-            const btn = document.getElementById(`verify-btn-${clientId}`);
-            if (btn) {
-                btn.innerHTML = '...';
-                btn.disabled = true;
-            }
-            
-            try {
-                const response = await fetch(`/api/sheets/clients/${clientId}/verify`, {
-                    method: 'POST',
-                    credentials: 'same-origin',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ 
-                        clean_address: cleanAddress,
-                        verified_district: verifiedDistrict 
-                    })
-                });
-                const data = await response.json();
-                
-                if (data.status === 'success') {
-                    // Update local client data
-                    const client = selectedClients.find(c => c.bsale_id == clientId);
-                    if (client) {
-                        client.verified = 'yes';
-                        client.clean_address = cleanAddress;
-                        client.verified_district = verifiedDistrict;
-                    }
-                    const allClient = allClients.find(c => c.bsale_id == clientId);
-                    if (allClient) {
-                        allClient.verified = 'yes';
-                        allClient.clean_address = cleanAddress;
-                        allClient.verified_district = verifiedDistrict;
-                    }
-                    renderSelectedClients();
-                } else {
-                    alert('Error: ' + (data.error || 'No se pudo verificar'));
-                    if (btn) {
-                        btn.innerHTML = '✓';
-                        btn.disabled = false;
-                    }
-                }
-            } catch (e) {
-                alert('Error de conexión: ' + e.message);
-                if (btn) {
-                    btn.innerHTML = '✓';
-                    btn.disabled = false;
-                }
-            }
-        }
-        
-        function closeVerifyPopup() {
-            const popup = document.querySelector('.verify-popup-overlay');
-            if (popup) popup.remove();
-        }
-        
-        function confirmVerify(clientId) {
-            closeVerifyPopup();
-            verifyClientAddress(clientId);
-        }
-        
-        async function verifyClientAddress(clientId) {
-            const btn = document.getElementById(`verify-btn-${clientId}`);
-            if (btn) {
-                btn.innerHTML = '...';
-                btn.disabled = true;
-            }
-            
-            try {
-                const response = await fetch(`/api/sheets/clients/${clientId}/verify`, {
-                    method: 'POST',
-                    credentials: 'same-origin',
-                    headers: { 'Content-Type': 'application/json' }
-                });
-                const data = await response.json();
-                
-                if (data.status === 'success') {
-                    // Update local client data
-                    const client = selectedClients.find(c => c.bsale_id == clientId);
-                    if (client) client.verified = 'yes';
-                    const allClient = allClients.find(c => c.bsale_id == clientId);
-                    if (allClient) allClient.verified = 'yes';
-                    
-                    renderSelectedClients();
-                    renderClientOptions(allClients);
-                    showSuccess('✓ Dirección verificada y guardada');
-                } else {
-                    showError(data.error || 'Error al verificar');
-                    if (btn) {
-                        btn.innerHTML = '✓';
-                        btn.disabled = false;
-                    }
-                }
-            } catch (err) {
-                console.error('Verify error:', err);
-                showError('Error de conexión');
-                if (btn) {
-                    btn.innerHTML = '✓';
-                    btn.disabled = false;
-                }
-            }
-        }
-        
-        function openFixModal(client) {
-            fixingClientId = client.bsale_id;
-            document.getElementById('modal-client-name').textContent = client.name || `${client.firstName || ''} ${client.lastName || ''}`.trim();
-            document.getElementById('modal-current-address').textContent = client.address || 'Sin dirección';
-            document.getElementById('modal-maps-link').value = client.maps_link || '';
-            document.getElementById('modal-clean-address').value = client.clean_address || client.address || '';
-            document.getElementById('modal-district').value = client.verified_district || client.district || '';
-            document.getElementById('fix-address-modal').classList.add('active');
-        }
-        
-        function closeFixModal() {
-            fixingClientId = null;
-            document.getElementById('fix-address-modal').classList.remove('active');
-        }
-        
-        async function saveFixedAddress() {
-            const mapsLink = document.getElementById('modal-maps-link').value.trim();
-            const cleanAddress = document.getElementById('modal-clean-address').value.trim();
-            const verifiedDistrict = document.getElementById('modal-district').value.trim();
-            
-            if (!mapsLink) {
-                alert('Por favor ingresa un link de Google Maps');
-                return;
-            }
-            
-            try {
-                const response = await fetch(`/api/sheets/clients/${fixingClientId}/fix`, {
-                    method: 'POST',
-                    credentials: 'same-origin',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ 
-                        maps_link: mapsLink,
-                        clean_address: cleanAddress,
-                        verified_district: verifiedDistrict
-                    })
-                });
-                const data = await response.json();
-                
-                if (data.status === 'success') {
-                    // Update local client data
-                    const client = selectedClients.find(c => c.bsale_id == fixingClientId);
-                    if (client) {
-                        client.verified = 'yes';
-                        client.maps_link = mapsLink;
-                        client.clean_address = cleanAddress;
-                        client.verified_district = verifiedDistrict;
-                    }
-                    const allClient = allClients.find(c => c.bsale_id == fixingClientId);
-                    if (allClient) {
-                        allClient.verified = 'yes';
-                        allClient.maps_link = mapsLink;
-                        allClient.clean_address = cleanAddress;
-                        allClient.verified_district = verifiedDistrict;
-                    }
-                    
-                    closeFixModal();
-                    renderSelectedClients();
-                    renderClientOptions(allClients);
-                    showSuccess('✓ Dirección corregida y verificada');
-                } else {
-                    alert(data.error || 'Error al guardar');
-                }
-            } catch (err) {
-                console.error('Fix error:', err);
-                alert('Error de conexión');
-            }
-        }
-        
-        function showSuccess(message) {
-            // Simple success notification
-            const errorContainer = document.getElementById('error-container');
-            errorContainer.innerHTML = `<div style="background: rgba(76, 175, 80, 0.1); border: 1px solid rgba(76, 175, 80, 0.3); color: #2e7d32; padding: 12px 16px; border-radius: 12px; margin-bottom: 16px;">${message}</div>`;
-            setTimeout(() => { errorContainer.innerHTML = ''; }, 3000);
-        }
-        
-        function formatLastUpdated(isoString) {
-            if (!isoString) return 'Nunca';
-            const date = new Date(isoString);
-            const now = new Date();
-            const diffMs = now - date;
-            const diffMins = Math.floor(diffMs / 60000);
-            const diffHours = Math.floor(diffMs / 3600000);
-            const diffDays = Math.floor(diffMs / 86400000);
-            
-            if (diffMins < 1) return 'Hace un momento';
-            if (diffMins < 60) return `Hace ${diffMins} min`;
-            if (diffHours < 24) return `Hace ${diffHours}h`;
-            if (diffDays < 7) return `Hace ${diffDays} días`;
-            return date.toLocaleDateString('es-PE', { day: 'numeric', month: 'short' });
-        }
-        
-        function updateCacheStatus(data) {
-            const statusEl = document.getElementById('cache-status');
-            const refreshBtn = document.getElementById('refresh-clients-btn');
-            
-            if (data.loading) {
-                const progress = data.progress || 0;
-                const total = data.total || 0;
-                const percent = total > 0 ? Math.round((progress / total) * 100) : 0;
-                statusEl.className = 'cache-status loading';
-                statusEl.innerHTML = `<span class="status-dot"></span> Actualizando... ${percent}% (${progress}/${total})`;
-                refreshBtn.classList.add('loading');
-            } else {
-                statusEl.className = 'cache-status';
-                statusEl.innerHTML = `<span class="status-dot"></span> ${data.count || 0} clientes • Actualizado: ${formatLastUpdated(data.last_updated)}`;
-                refreshBtn.classList.remove('loading');
-            }
-        }
-        
-        async function loadClients() {
-            const loadingEl = document.getElementById('loading-clients');
-            
-            // Try Google Sheets first (source of truth for verified addresses)
-            try {
-                const sheetsResponse = await fetch('/api/sheets/clients');
-                if (sheetsResponse.ok) {
-                    const sheetsData = await sheetsResponse.json();
-                    if (sheetsData.clients && sheetsData.clients.length > 0) {
-                        sheetsAvailable = true;
-                        allClients = sheetsData.clients;
-                        loadingEl.style.display = 'none';
-                        
-                        // Update status for sheets
-                        const statusEl = document.getElementById('cache-status');
-                        const verifiedCount = allClients.filter(c => c.verified === 'yes').length;
-                        statusEl.className = 'cache-status';
-                        statusEl.innerHTML = `<span class="status-dot"></span> ${allClients.length} clientes (${verifiedCount} verificados) • Fuente: Google Sheets`;
-                        
-                        renderClientOptions(allClients);
-                        return;
-                    }
-                }
-            } catch (err) {
-                console.log('Google Sheets not available, falling back to Bsale cache:', err);
-            }
-            
-            // Fall back to Bsale cache
-            try {
-                const response = await fetch('/api/clients');
-                const data = await response.json();
-                allClients = data.clients || [];
-                
-                // Update cache status
-                updateCacheStatus(data);
-                
-                // If still loading on server, show progress and retry
-                if (data.loading) {
-                    const progress = data.progress || 0;
-                    const total = data.total || 0;
-                    const percent = total > 0 ? Math.round((progress / total) * 100) : 0;
-                    
-                    // If we have cached clients, show them while loading
-                    if (allClients.length > 0) {
-                        loadingEl.style.display = 'none';
-                        renderClientOptions(allClients);
-                    } else {
-                        loadingEl.innerHTML = `
-                            <div class="loading-clients">
-                                <div class="progress-container">
-                                    <div class="progress-bar">
-                                        <div class="progress-fill" style="width: ${percent}%"></div>
-                                    </div>
-                                    <div class="progress-text">${progress.toLocaleString()} / ${total.toLocaleString()} clientes (${percent}%)</div>
-                                </div>
-                                <div class="loading-label"><span class="mini-spinner"></span> Cargando clientes de Bsale...</div>
-                            </div>
-                        `;
-                    }
-                    setTimeout(loadClients, 1000);
-                    return;
-                }
-                
-                if (allClients.length === 0) {
-                    loadingEl.innerHTML = '<div class="no-clients">No se encontraron clientes</div>';
-                } else {
-                    loadingEl.style.display = 'none';
-                    renderClientOptions(allClients);
-                }
-            } catch (err) {
-                console.error('Error loading clients:', err);
-                document.getElementById('loading-clients').innerHTML = 
-                    '<div class="no-clients">Error al cargar clientes</div>';
-            }
-        }
-        
-        let syncPollingInterval = null;
-        
-        async function refreshClients() {
-            const refreshBtn = document.getElementById('refresh-clients-btn');
-            if (refreshBtn.classList.contains('loading')) return;
-            
-            refreshBtn.classList.add('loading');
-            
-            try {
-                // Use the new sheets sync endpoint
-                const response = await fetch('/api/sheets/sync', { 
-                    method: 'POST'
-                });
-                const data = await response.json();
-                
-                if (data.status === 'started' || data.status === 'already_syncing') {
-                    // Start polling for sync status
-                    startSyncPolling();
-                }
-            } catch (err) {
-                console.error('Error starting sync:', err);
-                refreshBtn.classList.remove('loading');
-            }
-        }
-        
-        function startSyncPolling() {
-            if (syncPollingInterval) clearInterval(syncPollingInterval);
-            
-            const progressContainer = document.getElementById('sync-progress-container');
-            const progressFill = document.getElementById('sync-progress-fill');
-            const progressText = document.getElementById('sync-progress-text');
-            const statusEl = document.getElementById('cache-status');
-            
-            progressContainer.classList.add('active');
-            
-            syncPollingInterval = setInterval(async () => {
-                try {
-                    const response = await fetch('/api/sheets/sync/status');
-                    const state = await response.json();
-                    
-                    // Update UI based on sync state
-                    statusEl.className = 'cache-status syncing';
-                    
-                    if (state.stage === 'fetching_bsale') {
-                        statusEl.innerHTML = '<span class="status-dot"></span> Obteniendo clientes de Bsale...';
-                        progressFill.style.width = '10%';
-                        progressText.textContent = state.message;
-                    } else if (state.stage === 'comparing') {
-                        statusEl.innerHTML = '<span class="status-dot"></span> Comparando datos...';
-                        progressFill.style.width = '30%';
-                        progressText.textContent = state.message;
-                    } else if (state.stage === 'updating') {
-                        statusEl.innerHTML = '<span class="status-dot"></span> Actualizando...';
-                        progressFill.style.width = '50%';
-                        progressText.textContent = state.message;
-                    } else if (state.stage === 'geocoding') {
-                        const percent = state.total > 0 ? 50 + Math.round((state.progress / state.total) * 30) : 50;
-                        statusEl.innerHTML = `<span class="status-dot"></span> Geocodificando ${state.progress}/${state.total}...`;
-                        progressFill.style.width = percent + '%';
-                        progressText.textContent = state.message;
-                    } else if (state.stage === 'adding') {
-                        statusEl.innerHTML = '<span class="status-dot"></span> Guardando...';
-                        progressFill.style.width = '90%';
-                        progressText.textContent = state.message;
-                    } else if (state.stage === 'done') {
-                        stopSyncPolling();
-                        progressFill.style.width = '100%';
-                        progressText.textContent = '¡Listo!';
-                        
-                        // Show success message
-                        let msg = '✓ Sincronización completa';
-                        if (state.new_clients > 0) msg += ` • ${state.new_clients} nuevos`;
-                        if (state.updated_clients > 0) msg += ` • ${state.updated_clients} actualizados`;
-                        statusEl.className = 'cache-status';
-                        statusEl.innerHTML = `<span class="status-dot"></span> ${msg}`;
-                        
-                        // Hide progress bar after a moment and reload clients
-                        setTimeout(() => {
-                            progressContainer.classList.remove('active');
-                            loadClients();  // Reload the client list
-                        }, 1500);
-                    } else if (state.stage === 'error') {
-                        stopSyncPolling();
-                        statusEl.className = 'cache-status';
-                        statusEl.innerHTML = `<span class="status-dot" style="background:#ef5350;"></span> Error: ${state.error}`;
-                        progressContainer.classList.remove('active');
-                    }
-                    
-                    if (!state.syncing && state.stage !== 'done') {
-                        stopSyncPolling();
-                    }
-                } catch (err) {
-                    console.error('Sync polling error:', err);
-                }
-            }, 500);
-        }
-        
-        function stopSyncPolling() {
-            if (syncPollingInterval) {
-                clearInterval(syncPollingInterval);
-                syncPollingInterval = null;
-            }
-            const refreshBtn = document.getElementById('refresh-clients-btn');
-            refreshBtn.classList.remove('loading');
-        }
-        
-        // Track highlighted option index for keyboard navigation
-        let highlightedIndex = -1;
-        let currentFilteredClients = [];
-        
-        function setupClientSearch() {
-            const searchInput = document.getElementById('client-search');
-            const dropdown = document.getElementById('client-dropdown');
-            
-            searchInput.addEventListener('focus', () => {
-                dropdown.classList.add('active');
-                highlightedIndex = -1;
-            });
-            
-            // Keyboard navigation
-            searchInput.addEventListener('keydown', (e) => {
-                const options = dropdown.querySelectorAll('.client-option');
-                
-                if (e.key === 'Escape') {
-                    // Close dropdown and blur input
-                    dropdown.classList.remove('active');
-                    searchInput.blur();
-                    highlightedIndex = -1;
-                    updateHighlight(options);
-                    e.preventDefault();
-                    return;
-                }
-                
-                if (e.key === 'ArrowDown') {
-                    e.preventDefault();
-                    highlightedIndex = Math.min(highlightedIndex + 1, options.length - 1);
-                    updateHighlight(options);
-                    scrollOptionIntoView(options[highlightedIndex]);
-                    return;
-                }
-                
-                if (e.key === 'ArrowUp') {
-                    e.preventDefault();
-                    highlightedIndex = Math.max(highlightedIndex - 1, 0);
-                    updateHighlight(options);
-                    scrollOptionIntoView(options[highlightedIndex]);
-                    return;
-                }
-                
-                if (e.key === 'Enter' && highlightedIndex >= 0) {
-                    e.preventDefault();
-                    if (currentFilteredClients[highlightedIndex]) {
-                        toggleClient(currentFilteredClients[highlightedIndex]);
-                        highlightedIndex = -1;
-                        // Collapse dropdown and clear search after selection
-                        dropdown.classList.remove('active');
-                        searchInput.value = '';
-                        searchInput.blur();
-                    }
-                    return;
-                }
-            });
-            
-            searchInput.addEventListener('input', (e) => {
-                const query = e.target.value.toLowerCase().trim();
-                highlightedIndex = -1; // Reset highlight on new search
-                
-                if (!query) {
-                    currentFilteredClients = allClients.slice(0, 50);
-                    renderClientOptions(allClients);
-                    return;
-                }
-                
-                // Token-based fuzzy search: "Javier Gutierrez" matches "Javier Alonso Gutierrez"
-                // Also ignores accents: "García" matches "Garcia"
-                const normalizeText = (text) => text.normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase();
-                const normalizedQuery = normalizeText(query);
-                const searchTokens = normalizedQuery.split(/\s+/).filter(t => t.length > 0);
-                
-                const filtered = allClients.filter(c => {
-                    // Build searchable text from all relevant fields (handles both Bsale and Sheets format)
-                    const clientName = c.name || `${c.firstName || ''} ${c.lastName || ''}`.trim();
-                    const searchText = normalizeText([
-                        clientName,
-                        c.company || '',
-                        c.address || '',
-                        c.code || '',
-                        c.district || ''
-                    ].join(' '));
-                    
-                    // All search tokens must appear somewhere in the searchText
-                    return searchTokens.every(token => searchText.includes(token));
-                });
-                
-                // Sort results: exact matches first, then by how early the match appears
-                filtered.sort((a, b) => {
-                    const aName = normalizeText(a.name || `${a.firstName || ''} ${a.lastName || ''}`);
-                    const bName = normalizeText(b.name || `${b.firstName || ''} ${b.lastName || ''}`);
-                    const aExact = aName.startsWith(searchTokens[0]);
-                    const bExact = bName.startsWith(searchTokens[0]);
-                    if (aExact && !bExact) return -1;
-                    if (!aExact && bExact) return 1;
-                    return aName.localeCompare(bName);
-                });
-                
-                currentFilteredClients = filtered.slice(0, 50);
-                renderClientOptions(filtered);
-            });
-            
-            // Close dropdown when clicking outside
-            document.addEventListener('click', (e) => {
-                if (!e.target.closest('.client-selector')) {
-                    dropdown.classList.remove('active');
-                    highlightedIndex = -1;
-                }
-            });
-        }
-        
-        function updateHighlight(options) {
-            options.forEach((opt, i) => {
-                if (i === highlightedIndex) {
-                    opt.classList.add('highlighted');
-                } else {
-                    opt.classList.remove('highlighted');
-                }
-            });
-        }
-        
-        function scrollOptionIntoView(option) {
-            if (option) {
-                option.scrollIntoView({ block: 'nearest', behavior: 'smooth' });
-            }
-        }
-        
-        function renderClientOptions(clients) {
-            const dropdown = document.getElementById('client-dropdown');
-            
-            dropdown.innerHTML = '';
-            
-            if (clients.length === 0) {
-                dropdown.innerHTML = '<div class="no-clients">No se encontraron clientes</div>';
-                return;
-            }
-            
-            // Limit to first 50 for performance
-            const displayClients = clients.slice(0, 50);
-            
-            displayClients.forEach(client => {
-                const clientId = client.bsale_id || client.id;
-                const isSelected = selectedClients.some(c => (c.bsale_id || c.id) === clientId);
-                const isVerified = client.verified === 'yes';
-                const clientName = client.name || `${client.firstName || ''} ${client.lastName || ''}`.trim();
-                
-                const div = document.createElement('div');
-                div.className = 'client-option' + (isSelected ? ' selected' : '');
-                
-                // Compact status indicator
-                const statusDot = sheetsAvailable 
-                    ? `<span style="display:inline-block;width:6px;height:6px;border-radius:50%;background:${isVerified ? '#4caf50' : '#ff9800'};margin-right:8px;"></span>`
-                    : '';
-                
-                // For verified clients, show clean_address if available
-                let addressText;
-                if (isVerified && client.clean_address) {
-                    const district = client.verified_district || client.district || '';
-                    addressText = district ? `${client.clean_address} • ${district}` : client.clean_address;
-                } else {
-                    addressText = [client.address, client.district].filter(Boolean).join(', ');
-                }
-                
-                div.innerHTML = `
-                    <div class="client-name">${statusDot}${escapeHtml(clientName)}</div>
-                    ${addressText ? `<div class="client-address">${escapeHtml(addressText)}</div>` : ''}
-                `;
-                div.onclick = () => toggleClient(client);
-                dropdown.appendChild(div);
-            });
-            
-            // Show count if more results
-            if (clients.length > 50) {
-                const moreDiv = document.createElement('div');
-                moreDiv.className = 'no-clients';
-                moreDiv.textContent = `+ ${clients.length - 50} más. Escribe para filtrar.`;
-                dropdown.appendChild(moreDiv);
-            }
-        }
-        
-        function toggleClient(client) {
-            const clientId = client.bsale_id || client.id;
-            const idx = selectedClients.findIndex(c => (c.bsale_id || c.id) === clientId);
-            if (idx >= 0) {
-                selectedClients.splice(idx, 1);
-            } else {
-                selectedClients.push(client);
-                // Clear search field when selecting a client
-                document.getElementById('client-search').value = '';
-            }
-            renderSelectedClients();
-            
-            // Show all clients after selection
-            renderClientOptions(allClients);
-        }
-        
-        function renderSelectedClients() {
-            const container = document.getElementById('selected-clients');
-            container.innerHTML = selectedClients.map(c => {
-                const clientId = c.bsale_id || c.id;
-                const clientName = c.name || `${c.firstName || ''} ${c.lastName || ''}`.trim();
-                const isVerified = c.verified === 'yes';
-                
-                // For verified clients, prefer clean_address; otherwise show bsale address
-                let addressText;
-                if (isVerified && c.clean_address) {
-                    // Show formatted address with verified district
-                    const district = c.verified_district || c.district || '';
-                    addressText = district ? `${c.clean_address} • ${district}` : c.clean_address;
-                } else {
-                    // Show raw bsale address
-                    addressText = [c.address, c.district].filter(Boolean).join(', ') || 'Sin dirección';
-                }
-                
-                const phoneText = c.phone || '';
-                
-                // Phone display with click-to-call link
-                const phoneHtml = phoneText 
-                    ? `<span class="client-tag-phone">📞 <a href="tel:${phoneText}">${phoneText}</a></span>`
-                    : '';
-                
-                // Clean, compact tag with action buttons
-                const actionButtons = sheetsAvailable ? `
-                    <span class="client-tag-actions">
-                        <button class="client-tag-btn maps-btn" onclick="event.stopPropagation(); openMapsLink(selectedClients.find(x => (x.bsale_id||x.id)==${clientId}))" title="Ver en Maps">🗺️</button>
-                        ${!isVerified ? `<button class="client-tag-btn verify-btn" id="verify-btn-${clientId}" onclick="event.stopPropagation(); handleVerifyClick(${clientId})" title="Clic para confirmar verificación">✓</button>` : '<button class="client-tag-btn" style="opacity:0.3;cursor:default;background:#e8f5e9;border-color:#c8e6c9;" disabled title="Verificado">✓</button>'}
-                        <button class="client-tag-btn fix-btn" onclick="event.stopPropagation(); openFixModal(selectedClients.find(x => (x.bsale_id||x.id)==${clientId}))" title="Corregir dirección">✏️</button>
-                    </span>
-                ` : '';
-                
-                return `
-                    <div class="client-tag ${isVerified ? 'verified' : 'unverified'}">
-                        <span class="client-tag-status ${isVerified ? 'verified' : 'unverified'}"></span>
-                        <div class="client-tag-info">
-                            <span class="client-tag-name">${clientName}</span>
-                            <span class="client-tag-address">${escapeHtml(addressText)}</span>
-                            ${phoneHtml}
-                        </div>
-                        ${actionButtons}
-                        <button class="client-tag-remove" onclick="removeClient(${clientId})">×</button>
-                    </div>
-                `;
-            }).join('');
-            
-            // Update button state based on verification status
-            updateOptimizeButtonState();
-        }
-        
-        function updateOptimizeButtonState() {
-            const btn = document.getElementById('optimize-btn');
-            const warning = document.getElementById('unverified-warning');
-            const countSpan = document.getElementById('unverified-count');
-            
-            if (!sheetsAvailable || selectedClients.length === 0) {
-                // If sheets not available or no clients, allow route generation
-                btn.disabled = false;
-                warning.style.display = 'none';
-                return;
-            }
-            
-            // Count unverified clients
-            const unverifiedClients = selectedClients.filter(c => c.verified !== 'yes');
-            const unverifiedCount = unverifiedClients.length;
-            
-            if (unverifiedCount > 0) {
-                btn.disabled = true;
-                countSpan.textContent = unverifiedCount;
-                warning.style.display = 'flex';
-            } else {
-                btn.disabled = false;
-                warning.style.display = 'none';
-            }
-        }
-        
-        function removeClient(clientId) {
-            selectedClients = selectedClients.filter(c => (c.bsale_id || c.id) !== clientId);
-            renderSelectedClients();
-            renderClientOptions(allClients);
-        }
-        
-        async function optimizeRoute() {
-            const startUrl = document.getElementById('start').value.trim();
-            const endUrl = document.getElementById('end').value.trim();
-            const stopsText = document.getElementById('stops').value.trim();
-            
-            // Get manual URL stops
-            const manualStops = stopsText ? stopsText.split('\\n').filter(url => url.trim()) : [];
-            
-            // Get selected client IDs (handle both Bsale cache and Sheets format)
-            const clientIds = selectedClients.map(c => c.bsale_id || c.id);
-            
-            // If using Sheets data, also pass the maps links directly for verified clients
-            const clientMapsLinks = sheetsAvailable 
-                ? selectedClients.filter(c => c.maps_link && c.verified === 'yes').map(c => c.maps_link)
-                : [];
-            
-            // Need at least one stop (client or manual)
-            if (clientIds.length === 0 && manualStops.length === 0) {
-                showError('Selecciona al menos un cliente o agrega un link de Google Maps');
-                return;
-            }
-            
-            if (!startUrl || !endUrl) {
-                showError('Por favor ingresa los puntos de inicio y fin');
-                return;
-            }
-            
-            // Show loading
-            document.getElementById('form-section').style.display = 'none';
-            document.getElementById('loading').classList.add('active');
-            document.getElementById('results').style.display = 'none';
-            document.getElementById('error-container').innerHTML = '';
-            
-            try {
-                const response = await fetch('/optimize', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    credentials: 'same-origin',
-                    body: JSON.stringify({
-                        start: startUrl,
-                        end: endUrl,
-                        stops: manualStops,
-                        clientIds: clientIds
-                    })
-                });
-                
-                const data = await response.json();
-                
-                document.getElementById('loading').classList.remove('active');
-                
-                if (data.error) {
-                    showError(data.error);
-                    document.getElementById('form-section').style.display = 'block';
-                    return;
-                }
-                
-                displayResults(data);
-                
-            } catch (err) {
-                document.getElementById('loading').classList.remove('active');
-                document.getElementById('form-section').style.display = 'block';
-                showError('Error de conexión: ' + err.message);
-            }
-        }
-        
-        function displayResults(data) {
-            document.getElementById('results').style.display = 'block';
-            
-            // Store for summary generation
-            currentRouteData = data;
-            
-            // Update stats
-            document.getElementById('total-distance').textContent = data.total_distance;
-            document.getElementById('total-time').textContent = data.total_time;
-            
-            // Build timeline
-            const timeline = document.getElementById('route-timeline');
-            timeline.innerHTML = '';
-            
-            // Start
-            timeline.innerHTML += `
-                <div class="timeline-item start">
-                    <div class="timeline-marker">A</div>
-                    <div class="timeline-content">
-                        <div class="timeline-info">
-                            <div class="timeline-label">Inicio</div>
-                            <div class="timeline-address">${data.origin_address}</div>
-                            <div class="timeline-coords">${data.origin[0].toFixed(6)}, ${data.origin[1].toFixed(6)}</div>
-                        </div>
-                    </div>
-                </div>
-            `;
-            
-            // Stops
-            data.stops.forEach((stop, i) => {
-                timeline.innerHTML += `
-                    <div class="timeline-item">
-                        <div class="timeline-marker">${i + 1}</div>
-                        <div class="timeline-content">
-                            <div class="timeline-info">
-                                <div class="timeline-label">Parada ${i + 1}</div>
-                                <div class="timeline-address">${stop.address}</div>
-                                <div class="timeline-coords">${stop.coords[0].toFixed(6)}, ${stop.coords[1].toFixed(6)}</div>
-                            </div>
-                            <div class="timeline-metrics">
-                                <div class="metric-distance">${stop.distance}</div>
-                                <div class="metric-time">${stop.time}</div>
-                            </div>
-                        </div>
-                    </div>
-                `;
-            });
-            
-            // End
-            timeline.innerHTML += `
-                <div class="timeline-item end">
-                    <div class="timeline-marker">B</div>
-                    <div class="timeline-content">
-                        <div class="timeline-info">
-                            <div class="timeline-label">Destino Final</div>
-                            <div class="timeline-address">${data.destination_address}</div>
-                            <div class="timeline-coords">${data.destination[0].toFixed(6)}, ${data.destination[1].toFixed(6)}</div>
-                        </div>
-                        <div class="timeline-metrics">
-                            <div class="metric-distance">${data.last_leg_distance}</div>
-                            <div class="metric-time">${data.last_leg_time}</div>
-                        </div>
-                    </div>
-                </div>
-            `;
-            
-            // Maps links - handle single or multiple route parts
-            const mapsLinkContainer = document.getElementById('maps-link-container');
-            
-            if (data.route_parts && data.route_parts.length > 1) {
-                // Multiple route parts needed
-                mapsLinkContainer.innerHTML = `
-                    <div class="route-parts-notice">
-                        <span>📍</span> La ruta tiene ${data.stops.length} paradas y se divide en ${data.route_parts.length} partes
-                    </div>
-                    <div class="route-parts-buttons">
-                        ${data.route_parts.map((part, i) => `
-                            <a href="${part.url}" class="btn btn-maps route-part-btn" target="_blank">
-                                <span>🗺️</span>
-                                Ruta Parte ${part.part_number}
-                            </a>
-                        `).join('')}
-                    </div>
-                `;
-            } else {
-                // Single route
-                mapsLinkContainer.innerHTML = `
-                    <a href="${data.google_maps_url}" class="btn btn-maps" target="_blank">
-                        <span>🗺️</span>
-                        Abrir en Google Maps
-                    </a>
-                `;
-            }
-            
-            // Generate route summary for WhatsApp
-            generateRouteSummary(data);
-        }
-        
-        function generateRouteSummary(data) {
-            const titleInput = document.getElementById('route-title-input');
-            const summaryText = document.getElementById('route-summary-text');
-            
-            const title = titleInput.value || 'Ruta del día';
-            let summary = `*${title}*\\n\\n`;
-            
-            // Add each stop with number
-            let stopNumber = 1;
-            data.stops.forEach((stop, i) => {
-                if (stop.is_client && stop.client_name) {
-                    // Format client stop for WhatsApp with number
-                    summary += `*${stopNumber}.* ${stop.client_name}\\n`;
-                    
-                    // Add phone if available
-                    if (stop.phone) {
-                        summary += `${stop.phone}\\n`;
-                    }
-                    
-                    // Use clean_address if available, otherwise fall back to address extraction
-                    if (stop.clean_address) {
-                        summary += `${stop.clean_address}\\n`;
-                    } else {
-                        // Extract just the address part (after the name and dash)
-                        const addressParts = stop.address.split(' - ');
-                        if (addressParts.length > 1) {
-                            summary += `${addressParts.slice(1).join(' - ')}\\n`;
-                        }
-                    }
-                    
-                    // District on separate line
-                    if (stop.district) {
-                        summary += `${stop.district}\\n`;
-                    }
-                    
-                    summary += '\\n';
-                    stopNumber++;
-                } else {
-                    // Manual waypoint
-                    summary += `*${stopNumber}.* Parada manual\\n`;
-                    summary += `${stop.address}\\n\\n`;
-                    stopNumber++;
-                }
-            });
-            
-            // Add Google Maps links
-            if (data.route_parts && data.route_parts.length > 1) {
-                summary += '---\\n\\n';
-                data.route_parts.forEach(part => {
-                    summary += `${part.url}\\n\\n`;
-                });
-            } else if (data.google_maps_url) {
-                summary += '---\\n\\n';
-                summary += `${data.google_maps_url}\\n`;
-            }
-            
-            summaryText.value = summary.trim();
-        }
-        
-        function updateRouteSummary() {
-            if (currentRouteData) {
-                generateRouteSummary(currentRouteData);
-            }
-        }
-        
-        async function copyRouteSummary() {
-            const summaryText = document.getElementById('route-summary-text').value;
-            const copyBtn = document.querySelector('.btn-copy');
-            const copyIcon = document.getElementById('copy-icon');
-            const copyText = document.getElementById('copy-text');
-            
-            try {
-                await navigator.clipboard.writeText(summaryText);
-                
-                // Visual feedback
-                copyBtn.classList.add('copied');
-                copyIcon.textContent = '✓';
-                copyText.textContent = '¡Copiado!';
-                
-                setTimeout(() => {
-                    copyBtn.classList.remove('copied');
-                    copyIcon.textContent = '📋';
-                    copyText.textContent = 'Copiar';
-                }, 2000);
-            } catch (err) {
-                // Fallback for older browsers
-                const textarea = document.getElementById('route-summary-text');
-                textarea.select();
-                document.execCommand('copy');
-                
-                copyBtn.classList.add('copied');
-                copyIcon.textContent = '✓';
-                copyText.textContent = '¡Copiado!';
-                
-                setTimeout(() => {
-                    copyBtn.classList.remove('copied');
-                    copyIcon.textContent = '📋';
-                    copyText.textContent = 'Copiar';
-                }, 2000);
-            }
-        }
-        
-        function showError(message) {
-            document.getElementById('error-container').innerHTML = `
-                <div class="error-banner">${message}</div>
-            `;
-        }
-        
-        function resetForm() {
-            document.getElementById('results').style.display = 'none';
-            document.getElementById('form-section').style.display = 'block';
-            document.getElementById('error-container').innerHTML = '';
-            currentRouteData = null;
-            document.getElementById('route-summary-text').value = '';
-            document.getElementById('route-title-input').value = 'Ruta del día';
-        }
-    </script>
-    
-    <!-- Fix Address Modal -->
-    <div class="modal-overlay" id="fix-address-modal">
-        <div class="modal-content modal-content-wide">
-            <h3 class="modal-title">📍 Corregir Dirección</h3>
-            <div class="modal-body">
-                <p><strong id="modal-client-name"></strong></p>
-                <p class="modal-bsale-address">Dirección Bsale: <span id="modal-current-address"></span></p>
-                
-                <div class="modal-field">
-                    <label>Link de Google Maps:</label>
-                    <input type="text" class="modal-input" id="modal-maps-link" placeholder="https://maps.app.goo.gl/...">
-                </div>
-                
-                <div class="modal-field">
-                    <label>Dirección formateada (para WhatsApp):</label>
-                    <textarea class="modal-input" id="modal-clean-address" rows="3" placeholder="Ej: Av. Benavides 4331&#10;Piso 3B"></textarea>
-                </div>
-                
-                <div class="modal-field">
-                    <label>Distrito:</label>
-                    <input type="text" class="modal-input" id="modal-district" placeholder="Ej: Miraflores, San Isidro">
-                </div>
-            </div>
-            <div class="modal-actions">
-                <button class="modal-btn modal-btn-cancel" onclick="closeFixModal()">Cancelar</button>
-                <button class="modal-btn modal-btn-save" onclick="saveFixedAddress()">Guardar y Verificar</button>
-            </div>
-        </div>
-    </div>
-</body>
-</html>
-"""
-
-
-@app.route('/')
-@requires_auth
-def index():
-    return render_template_string(HTML_TEMPLATE)
-
-
-@app.route('/api/clients')
-@requires_auth
-def get_clients():
-    """Get clients from cache."""
-    clients = CLIENTS_CACHE["clients"]
-    return jsonify({
-        "clients": clients,
-        "loading": CLIENTS_CACHE["loading"],
-        "loaded": CLIENTS_CACHE["loaded"],
-        "count": len(clients),
-        "progress": CLIENTS_CACHE["loading_progress"],
-        "total": CLIENTS_CACHE["total_count"],
-        "last_updated": CLIENTS_CACHE["last_updated"]
-    })
-
-
-@app.route('/api/clients/refresh', methods=['POST'])
-@requires_auth
-def refresh_clients():
-    """Force refresh clients from Bsale API."""
-    if CLIENTS_CACHE["loading"]:
-        return jsonify({"status": "already_loading", "message": "Ya se está actualizando"})
-    
-    # Start background refresh
-    thread = threading.Thread(target=fetch_bsale_clients_from_api)
-    thread.daemon = True
-    thread.start()
-    
-    return jsonify({"status": "started", "message": "Actualizando clientes..."})
-
-
-# ============================================================================
-# Google Sheets Client Verification Endpoints
-# ============================================================================
-
-@app.route('/api/sheets/clients')
-@requires_auth
-def get_sheets_clients():
-    """Get clients from Google Sheet (source of truth for addresses)."""
-    try:
-        from sheets import get_all_clients
-        clients = get_all_clients()
-        return jsonify({
-            "clients": clients,
-            "count": len(clients),
-            "source": "google_sheets"
-        })
-    except ImportError:
-        return jsonify({"error": "Google Sheets module not available"}), 500
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-
-@app.route('/api/sheets/clients/<int:bsale_id>')
-@requires_auth  
-def get_sheets_client(bsale_id):
-    """Get a single client from Google Sheet by Bsale ID."""
-    try:
-        from sheets import get_client_by_bsale_id
-        client = get_client_by_bsale_id(bsale_id)
-        if client:
-            return jsonify({"client": client})
-        return jsonify({"error": "Cliente no encontrado"}), 404
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-
-@app.route('/api/sheets/clients/<int:bsale_id>/verify', methods=['POST'])
-@requires_auth
-def verify_client_address(bsale_id):
-    """Mark a client's address as verified in Google Sheet."""
-    try:
-        from sheets import verify_client
-        data = request.json or {}
-        clean_address = data.get('clean_address')
-        verified_district = data.get('verified_district')
+    return CLIENTS_PAYLOAD
+
+
+@app.route('/api/clients')
+@requires_auth
+def get_clients():
+    """
+    Get clients from cache.
+    Pass ?meta=1 to get only the cache status without the client list.
+    The full list is gzip-compressed when accepted and supports If-None-Match.
+    """
+    if request.args.get('meta'):
+        return json_response(get_clients_status())
+    
+    payload = get_clients_payload()
+    response = Response(payload["body"], mimetype='application/json')
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(payload["gzip"])
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(payload["etag"] + "-gzip")
+    else:
+        response.set_etag(payload["etag"])
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Always revalidate; an unchanged list costs a 304 instead of a download
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+@app.route('/api/clients/stream')
+@requires_auth
+def stream_clients_status():
+    """
+    Stream cache loading progress as Server-Sent Events.
+    Sends the cache status every second while loading, then a final event once
+    loading is done. The client list itself is fetched once from /api/clients.
+    Streams close after CLIENTS_STREAM_MAX_SECONDS so they can't tie up workers.
+    """
+    def generate():
+        deadline = time.time() + CLIENTS_STREAM_MAX_SECONDS
+        while True:
+            status = get_clients_status()
+            yield b"data: " + orjson.dumps(status) + b"\n\n"
+            if not status["loading"] or time.time() >= deadline:
+                break
+            time.sleep(1)
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/clients/refresh', methods=['POST'])
+@requires_auth
+def refresh_clients():
+    """Force refresh clients from Bsale API."""
+    if CLIENTS_CACHE["loading"]:
+        return json_response({"status": "already_loading", "message": "Ya se está actualizando"})
+    
+    # Start background refresh
+    thread = threading.Thread(target=fetch_bsale_clients_from_api)
+    thread.daemon = True
+    thread.start()
+    
+    return json_response({"status": "started", "message": "Actualizando clientes..."})
+
+
+# ============================================================================
+# Google Sheets Client Verification Endpoints
+# ============================================================================
+
+@app.route('/api/sheets/clients')
+@requires_auth
+def get_sheets_clients():
+    """Get clients from Google Sheet (source of truth for addresses)."""
+    try:
+        from sheets import get_all_clients
+        clients = get_all_clients()
+        return json_response({
+            "clients": clients,
+            "count": len(clients),
+            "source": "google_sheets"
+        })
+    except ImportError:
+        return json_response({"error": "Google Sheets module not available"}, 500)
+    except Exception as e:
+        return json_response({"error": str(e)}, 500)
+
+
+@app.route('/api/sheets/clients/<int:bsale_id>')
+@requires_auth  
+def get_sheets_client(bsale_id):
+    """Get a single client from Google Sheet by Bsale ID."""
+    try:
+        from sheets import get_client_by_bsale_id
+        client = get_client_by_bsale_id(bsale_id)
+        if client:
+            return json_response({"client": client})
+        return json_response({"error": "Cliente no encontrado"}, 404)
+    except Exception as e:
+        return json_response({"error": str(e)}, 500)
+
+
+@app.route('/api/sheets/clients/<int:bsale_id>/verify', methods=['POST'])
+@requires_auth
+def verify_client_address(bsale_id):
+    """Mark a client's address as verified in Google Sheet."""
+    try:
+        from sheets import verify_client
+        data = request.json or {}
+        clean_address = data.get('clean_address')
+        verified_district = data.get('verified_district')
         
         success = verify_client(bsale_id, clean_address=clean_address, verified_district=verified_district)
         if success:
-            return jsonify({"status": "success", "message": "Dirección verificada"})
-        return jsonify({"error": "No se pudo verificar la dirección"}), 400
+            return json_response({"status": "success", "message": "Dirección verificada"})
+        return json_response({"error": "No se pudo verificar la dirección"}, 400)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 
 @app.route('/api/sheets/clients/<int:bsale_id>/fix', methods=['POST'])
@@ -3512,11 +1102,11 @@ def fix_client_address(bsale_id):
     maps_link = data.get('maps_link', '')
     
     if not maps_link:
-        return jsonify({"error": "Se requiere maps_link"}), 400
+        return json_response({"error": "Se requiere maps_link"}, 400)
     
     # Validate it's a Google Maps URL
     if 'google.com/maps' not in maps_link and 'goo.gl' not in maps_link and 'maps.app' not in maps_link:
-        return jsonify({"error": "El link debe ser una URL de Google Maps"}), 400
+        return json_response({"error": "El link debe ser una URL de Google Maps"}, 400)
     
     clean_address = data.get('clean_address')
     verified_district = data.get('verified_district')
@@ -3525,10 +1115,10 @@ def fix_client_address(bsale_id):
         from sheets import fix_client_address as fix_address
         success = fix_address(bsale_id, maps_link, clean_address=clean_address, verified_district=verified_district)
         if success:
-            return jsonify({"status": "success", "message": "Dirección corregida y verificada"})
-        return jsonify({"error": "No se pudo actualizar la dirección"}), 400
+            return json_response({"status": "success", "message": "Dirección corregida y verificada"})
+        return json_response({"error": "No se pudo actualizar la dirección"}, 400)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 
 @app.route('/api/sheets/sync', methods=['POST'])
@@ -3538,7 +1128,7 @@ def sync_bsale_to_sheets():
     global SYNC_STATE
     
     if SYNC_STATE["syncing"]:
-        return jsonify({"status": "already_syncing", "message": "Ya se está sincronizando"})
+        return json_response({"status": "already_syncing", "message": "Ya se está sincronizando"})
     
     try:
         def run_sync_with_progress():
@@ -3556,7 +1146,7 @@ def sync_bsale_to_sheets():
             
             try:
                 from sheets import get_all_clients, get_existing_bsale_ids, add_clients, batch_update_client_details
-                from sync_clients import fetch_all_bsale_clients, geocode_address
+                from sync_clients import fetch_all_bsale_clients, geocode_clients, WEB_SYNC_CHECKPOINT_FILE
                 
                 # Step 1: Fetch from Bsale
                 SYNC_STATE["message"] = "Obteniendo clientes de Bsale..."
@@ -3575,9 +1165,10 @@ def sync_bsale_to_sheets():
                 # Step 2: Get existing IDs from sheets
                 existing_ids = get_existing_bsale_ids()
                 
-                # Separate new and existing
-                new_clients = [c for c in bsale_clients if str(c.get("bsale_id")) not in existing_ids]
-                existing_clients = [c for c in bsale_clients if str(c.get("bsale_id")) in existing_ids]
+                # Separate new and existing in one pass
+                new_clients, existing_clients = [], []
+                for c in bsale_clients:
+                    (existing_clients if str(c.get("bsale_id")) in existing_ids else new_clients).append(c)
                 
                 SYNC_STATE["new_clients"] = len(new_clients)
                 
@@ -3593,24 +1184,27 @@ def sync_bsale_to_sheets():
                     SYNC_STATE["stage"] = "geocoding"
                     SYNC_STATE["message"] = f"Geocodificando {len(new_clients)} clientes nuevos..."
                     
-                    for i, client in enumerate(new_clients):
-                        address = client.get("address", "")
-                        city = client.get("city", "")
-                        district = client.get("district", "")
-                        
-                        if address:
-                            maps_link = geocode_address(address, city, district)
-                            client["maps_link"] = maps_link
-                        else:
-                            client["maps_link"] = ""
-                        
-                        SYNC_STATE["progress"] = i + 1
-                        SYNC_STATE["message"] = f"Geocodificando {i + 1}/{len(new_clients)}..."
-                        time.sleep(0.05)  # Rate limiting
+                    def report_progress(done, total, geocoded):
+                        SYNC_STATE["progress"] = done
+                        SYNC_STATE["message"] = f"Geocodificando {done}/{total}..."
+                    
+                    # Geocoded clients are added to the sheet in batches as they finish
+                    written = {"added": 0, "submitted": 0}
+                    
+                    def add_batch(batch):
+                        written["added"] += add_clients(batch)
+                        written["submitted"] += len(batch)
                     
-                    SYNC_STATE["stage"] = "adding"
-                    SYNC_STATE["message"] = "Agregando clientes nuevos..."
-                    add_clients(new_clients)
+                    geocode_clients(
+                        new_clients,
+                        on_progress=report_progress,
+                        on_batch=add_batch,
+                        checkpoint_file=WEB_SYNC_CHECKPOINT_FILE
+                    )
+                    
+                    # Keep the checkpoint if any batch failed to write, so a rerun resumes
+                    if written["added"] == written["submitted"]:
+                        WEB_SYNC_CHECKPOINT_FILE.unlink(missing_ok=True)
                 
                 SYNC_STATE["stage"] = "done"
                 SYNC_STATE["message"] = "¡Sincronización completa!"
@@ -3625,16 +1219,26 @@ def sync_bsale_to_sheets():
         thread.daemon = True
         thread.start()
         
-        return jsonify({"status": "started", "message": "Sincronización iniciada"})
+        return json_response({"status": "started", "message": "Sincronización iniciada"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 
 @app.route('/api/sheets/sync/status')
 @requires_auth
 def get_sync_status():
     """Get current sync status."""
-    return jsonify(SYNC_STATE)
+    return json_response(SYNC_STATE)
+
+
+def get_sheets_clients_map() -> dict:
+    """Get Google Sheets clients keyed by bsale_id (empty if Sheets is unavailable)."""
+    try:
+        from sheets import get_all_clients
+        return {str(c.get('bsale_id')): c for c in get_all_clients()}
+    except Exception as e:
+        print(f"Could not load sheets clients: {e}")
+        return {}
 
 
 @app.route('/optimize', methods=['POST'])
@@ -3647,26 +1251,32 @@ def optimize():
     stop_urls = data.get('stops', [])
     client_ids = data.get('clientIds', [])
     
+    # Start the independent lookups together so their network waits overlap
+    origin_future = GEOCODE_POOL.submit(extract_coords_from_url, start_url)
+    destination_future = GEOCODE_POOL.submit(extract_coords_from_url, end_url)
+    sheets_future = GEOCODE_POOL.submit(get_sheets_clients_map) if client_ids else None
+    stop_coords = GEOCODE_POOL.map(extract_coords_from_url, stop_urls)
+    
     # Parse coordinates
-    origin = extract_coords_from_url(start_url)
+    origin = origin_future.result()
     if not origin:
-        return jsonify({"error": f"No se pudo extraer coordenadas del inicio: {start_url}"})
+        return json_response({"error": f"No se pudo extraer coordenadas del inicio: {start_url}"})
     
-    destination = extract_coords_from_url(end_url)
+    destination = destination_future.result()
     if not destination:
-        return jsonify({"error": f"No se pudo extraer coordenadas del fin: {end_url}"})
+        return json_response({"error": f"No se pudo extraer coordenadas del fin: {end_url}"})
+    
+    # Endpoint addresses don't depend on the route, so look them up during routing.
+    # Lookups are deduped per ~10m cell (e.g. round trips back to the depot)
+    address_futures = {round_coords(origin): GEOCODE_POOL.submit(reverse_geocode, origin)}
+    if round_coords(destination) not in address_futures:
+        address_futures[round_coords(destination)] = GEOCODE_POOL.submit(reverse_geocode, destination)
     
     waypoints = []
     waypoint_info = []  # Store extra info for each waypoint
     
     # Try to get clients from Google Sheets first (has verified addresses)
-    sheets_clients = {}
-    try:
-        from sheets import get_all_clients
-        all_sheets_clients = get_all_clients()
-        sheets_clients = {str(c.get('bsale_id')): c for c in all_sheets_clients}
-    except Exception as e:
-        print(f"Could not load sheets clients: {e}")
+    sheets_clients = sheets_future.result() if sheets_future else {}
     
     # Get coordinates from clients
     if client_ids:
@@ -3705,7 +1315,8 @@ def optimize():
                 
                 # Fall back to geocoding address
                 if not coords and client_address:
-                    coords = geocode_address(
+                    coords = geocode_client(
+                        client_id,
                         client_address,
                         sheets_client.get('city', ''),
                         sheets_client.get('district', '')
@@ -3719,7 +1330,8 @@ def optimize():
                     client_address = bsale_client.get('address', '')
                     client_phone = bsale_client.get('phone', '')
                     client_district = bsale_client.get('district', '')
-                    coords = geocode_address(
+                    coords = geocode_client(
+                        client_id,
                         client_address,
                         bsale_client.get('city', ''),
                         bsale_client.get('district', '')
@@ -3737,9 +1349,8 @@ def optimize():
                     'is_client': True
                 })
     
-    # Get coordinates from manual URLs
-    for url in stop_urls:
-        coords = extract_coords_from_url(url)
+    # Get coordinates from manual URLs (resolved concurrently above)
+    for coords in stop_coords:
         if coords:
             waypoints.append(coords)
             waypoint_info.append({
@@ -3753,16 +1364,20 @@ def optimize():
             })
     
     if not waypoints:
-        return jsonify({"error": "No se encontraron paradas válidas"})
+        return json_response({"error": "No se encontraron paradas válidas"})
     
-    # Call Routes API
-    result = optimize_route(origin, destination, waypoints)
+    # Reject up front instead of paying a round trip for the API's 400
+    if len(waypoints) > ROUTES_MAX_WAYPOINTS:
+        return json_response({"error": f"Máximo {ROUTES_MAX_WAYPOINTS} paradas intermedias (recibido {len(waypoints)})"})
+    
+    # Compute optimal order (locally for small routes, otherwise via Routes API)
+    result = plan_route(origin, destination, waypoints)
     
     if "error" in result:
-        return jsonify({"error": result["error"]})
+        return json_response({"error": result["error"]})
     
     if "routes" not in result:
-        return jsonify({"error": "No se pudo calcular la ruta"})
+        return json_response({"error": "No se pudo calcular la ruta"})
     
     route = result["routes"][0]
     optimized_order = route.get("optimizedIntermediateWaypointIndex", list(range(len(waypoints))))
@@ -3773,22 +1388,36 @@ def optimize():
     
     # Get totals
     total_distance = route.get("distanceMeters", 0)
-    total_duration_str = route.get("duration", "0s")
-    total_duration = int(total_duration_str.rstrip("s"))
-    
-    # Reverse geocode all points to get addresses
-    origin_address = reverse_geocode(origin)
-    destination_address = reverse_geocode(destination)
+    total_duration = parse_duration(route.get("duration", "0s"))
+    
+    # Reverse geocode non-client stops in one batch, reusing the endpoint lookups
+    stop_points = [
+        coords for coords, info in zip(ordered_waypoints, ordered_info)
+        if not (info.get('is_client') and info.get('client_name'))
+        and round_coords(coords) not in address_futures
+    ]
+    stop_addresses = dict(zip(map(round_coords, stop_points), reverse_geocode_batch(stop_points)))
+    origin_address = address_futures[round_coords(origin)].result()
+    destination_address = address_futures[round_coords(destination)].result()
+    
+    # Format each leg's distance and time once
+    leg_metrics = [
+        (format_distance(leg.get("distanceMeters", 0)), format_duration(parse_duration(leg.get("duration", "0s"))))
+        for leg in route.get("legs", [])
+    ]
     
     # Build response
-    legs = route.get("legs", [])
     stops_data = []
     for i, (coords, info) in enumerate(zip(ordered_waypoints, ordered_info)):
         # Use client info if available, otherwise reverse geocode
         if info.get('is_client') and info.get('client_name'):
             address_display = f"{info['client_name']} - {info['address']}"
         else:
-            address_display = reverse_geocode(coords)
+            key = round_coords(coords)
+            if key in stop_addresses:
+                address_display = stop_addresses[key]
+            else:
+                address_display = address_futures[key].result()
         
         leg_info = {
             "coords": coords,
@@ -3802,28 +1431,17 @@ def optimize():
             "district": info.get('district'),
             "is_client": info.get('is_client', False)
         }
-        if i < len(legs):
-            leg = legs[i]
-            leg_dist = leg.get("distanceMeters", 0)
-            leg_dur_str = leg.get("duration", "0s")
-            leg_dur = int(leg_dur_str.rstrip("s"))
-            leg_info["distance"] = format_distance(leg_dist)
-            leg_info["time"] = format_duration(leg_dur)
+        if i < len(leg_metrics):
+            leg_info["distance"], leg_info["time"] = leg_metrics[i]
         stops_data.append(leg_info)
     
     # Last leg info
-    last_leg_dist = "--"
-    last_leg_time = "--"
-    if legs:
-        last_leg = legs[-1]
-        last_leg_dist = format_distance(last_leg.get("distanceMeters", 0))
-        last_dur_str = last_leg.get("duration", "0s")
-        last_leg_time = format_duration(int(last_dur_str.rstrip("s")))
+    last_leg_dist, last_leg_time = leg_metrics[-1] if leg_metrics else ("--", "--")
     
     # Generate route URLs - split if more than 8 waypoints
     route_parts = generate_split_routes(origin, destination, ordered_waypoints)
     
-    return jsonify({
+    return json_response({
         "origin": origin,
         "origin_address": origin_address,
         "destination": destination,
@@ -3840,6 +1458,7 @@ def optimize():
 
 
 if __name__ == '__main__':
-    # Preload Bsale clients in background on startup
-    preload_clients()
+    # Preload clients in background so the server binds immediately;
+    # until then /api/clients reports loading and the page shows progress
+    threading.Thread(target=preload_clients, daemon=True).start()
     app.run(debug=True, port=5000)
@@ -0,0 +1,136 @@
+"""
+Persistent key/value cache for MiuRuta.
+Stores JSON-serializable values in a local SQLite file so results from the
+Google APIs survive restarts and are shared between worker processes.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+# Cache database path (override with CACHE_DB_PATH)
+CACHE_DB_FILE = Path(os.getenv("CACHE_DB_PATH", Path(__file__).parent / "cache.sqlite"))
+
+# sqlite3 connections can't be shared between threads, so keep one per thread
+CONNECTIONS = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Return this thread's SQLite connection.
+    Creates the cache table and purges expired entries on first use.
+    """
+    conn = getattr(CONNECTIONS, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_DB_FILE, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        CONNECTIONS.conn = conn
+    return conn
+
+
+def cache_get(namespace: str, key: str) -> Optional[Any]:
+    """
+    Get a cached value.
+    Returns None if the key is missing, expired, or the cache is unavailable.
+    """
+    try:
+        row = get_connection().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Cache read error ({namespace}): {e}")
+        return None
+
+    if not row:
+        return None
+
+    value, expires_at = row
+    if expires_at is not None and expires_at < time.time():
+        return None
+
+    return json.loads(value)
+
+
+def cache_set(namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+    """
+    Store a value in the cache.
+
+    Args:
+        namespace: Logical cache name (e.g. "client_coords")
+        key: Key within the namespace
+        value: Any JSON-serializable value
+        ttl: Seconds until the entry expires, or None to keep it forever
+    """
+    expires_at = time.time() + ttl if ttl else None
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+    except sqlite3.Error as e:
+        print(f"Cache write error ({namespace}): {e}")
+
+
+def cache_get_many(namespace: str, keys: list[str]) -> dict[str, Any]:
+    """
+    Get several cached values in one pass.
+    Missing or expired keys are left out of the returned dict.
+    """
+    results = {}
+    now = time.time()
+    try:
+        conn = get_connection()
+        # Stay well under SQLite's limit on bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value, expires_at FROM cache WHERE namespace = ? AND key IN ({placeholders})",
+                (namespace, *chunk)
+            ).fetchall()
+            for key, value, expires_at in rows:
+                if expires_at is None or expires_at >= now:
+                    results[key] = json.loads(value)
+    except sqlite3.Error as e:
+        print(f"Cache read error ({namespace}): {e}")
+    return results
+
+
+def cache_set_many(namespace: str, items: dict[str, Any], ttl: Optional[float] = None):
+    """Store several values in a single transaction."""
+    if not items:
+        return
+    
+    expires_at = time.time() + ttl if ttl else None
+    try:
+        conn = get_connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                [
+                    (namespace, key, json.dumps(value, ensure_ascii=False), expires_at)
+                    for key, value in items.items()
+                ]
+            )
+    except sqlite3.Error as e:
+        print(f"Cache write error ({namespace}): {e}")
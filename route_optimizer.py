@@ -9,16 +9,48 @@ import json
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from urllib.parse import parse_qs, unquote, urlparse
 
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from urls import SHORT_URL_RE, find_place_or_center, follow_short_url
 
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 ROUTES_API_URL = "https://routes.googleapis.com/directions/v2:computeRoutes"
+ROUTES_FIELD_MASK = "routes.optimizedIntermediateWaypointIndex,routes.duration,routes.distanceMeters,routes.legs.duration,routes.legs.distanceMeters"
+
+# Request options shared by every computeRoutes call; only the points vary
+ROUTE_REQUEST_TEMPLATE = {
+    "travelMode": "DRIVE",
+    "optimizeWaypointOrder": True,
+    "routingPreference": "TRAFFIC_AWARE",
+    "computeAlternativeRoutes": False,
+    "languageCode": "es",
+    "units": "METRIC",
+}
+
+# Shared HTTP session: reuses TCP/TLS connections across calls and retries
+# transient errors (urllib3 only retries idempotent methods on bad status)
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504])
+))
 
+# Google Maps URL coordinate patterns, in priority order (place pin and map
+# center come first, see urls.py)
+Q_PARAM_COORDS_RE = re.compile(r"[?&]q=(-?\d+\.?\d*),(-?\d+\.?\d*)")
+QUERY_COORDS_RE = re.compile(r"(-?\d+\.?\d*),\s*(-?\d+\.?\d*)")
+PATH_COORDS_RE = re.compile(r"/(-?\d+\.?\d*),(-?\d+\.?\d*)")
 
 def extract_coords_from_url(url: str) -> tuple[float, float] | None:
     """
@@ -34,42 +66,40 @@ def extract_coords_from_url(url: str) -> tuple[float, float] | None:
     url = url.strip()
     
     # Handle short URLs by following redirects
-    if "goo.gl" in url or "maps.app" in url:
+    if SHORT_URL_RE.match(url):
         try:
-            response = requests.head(url, allow_redirects=True, timeout=10)
-            url = response.url
+            url = follow_short_url(url)
         except requests.RequestException as e:
             print(f"Warning: Could not resolve short URL {url}: {e}")
             return None
     
-    # Pattern 1: !3d and !4d format (actual place coordinates in data parameter)
-    # This is the most accurate for place URLs
-    place_lat = re.search(r'!3d(-?\d+\.?\d*)', url)
-    place_lng = re.search(r'!4d(-?\d+\.?\d*)', url)
-    if place_lat and place_lng:
-        return float(place_lat.group(1)), float(place_lng.group(1))
+    # Patterns 1 and 2: !3d/!4d place coordinates (most accurate for place
+    # URLs), else the @ map center (e.g., /@-12.0464,-77.0428,17z)
+    coords = find_place_or_center(url)
+    if coords:
+        return coords
     
-    # Pattern 2: Coordinates in @ format (e.g., /@-12.0464,-77.0428,17z) - fallback
-    at_pattern = r"@(-?\d+\.?\d*),(-?\d+\.?\d*)"
-    match = re.search(at_pattern, url)
+    # Pattern 3a: plain ?q=lat,lng, read straight from the URL
+    match = Q_PARAM_COORDS_RE.search(url)
     if match:
         return float(match.group(1)), float(match.group(2))
     
-    # Pattern 3: Coordinates in query parameter (e.g., ?q=-12.0464,-77.0428)
+    # The remaining patterns need the URL split up; parse it once here
     parsed = urlparse(url)
-    query_params = parse_qs(parsed.query)
+    path, query = parsed.path, parsed.query
+    # Only build the query dict when it can hold q= or ll=
+    query_params = parse_qs(query) if "q=" in query or "ll=" in query else {}
     
+    # Pattern 3b: Coordinates inside an encoded q value (e.g., ?q=Casa%20-12.0464,%20-77.0428)
     if "q" in query_params:
         q_value = query_params["q"][0]
-        coord_pattern = r"(-?\d+\.?\d*),\s*(-?\d+\.?\d*)"
-        match = re.search(coord_pattern, q_value)
+        match = QUERY_COORDS_RE.search(q_value)
         if match:
             return float(match.group(1)), float(match.group(2))
     
     # Pattern 4: Coordinates in the path for place URLs
     # e.g., /maps/place/Some+Place/-12.0464,-77.0428
-    path_pattern = r"/(-?\d+\.?\d*),(-?\d+\.?\d*)"
-    match = re.search(path_pattern, parsed.path)
+    match = PATH_COORDS_RE.search(path)
     if match:
         return float(match.group(1)), float(match.group(2))
     
@@ -104,43 +134,34 @@ def optimize_route(
         print("Error: GOOGLE_MAPS_API_KEY not set in environment")
         sys.exit(1)
     
-    def make_waypoint(coords: tuple[float, float]) -> dict:
-        return {
-            "location": {
-                "latLng": {
-                    "latitude": coords[0],
-                    "longitude": coords[1]
-                }
-            }
-        }
-    
     request_body = {
-        "origin": make_waypoint(origin),
-        "destination": make_waypoint(destination),
-        "intermediates": [make_waypoint(wp) for wp in waypoints],
-        "travelMode": "DRIVE",
-        "optimizeWaypointOrder": True,
-        "routingPreference": "TRAFFIC_AWARE",
-        "computeAlternativeRoutes": False,
-        "languageCode": "es",
-        "units": "METRIC",
+        **ROUTE_REQUEST_TEMPLATE,
+        "origin": {"location": {"latLng": {"latitude": origin[0], "longitude": origin[1]}}},
+        "destination": {"location": {"latLng": {"latitude": destination[0], "longitude": destination[1]}}},
+        "intermediates": [
+            {"location": {"latLng": {"latitude": lat, "longitude": lng}}}
+            for lat, lng in waypoints
+        ],
     }
     
     headers = {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": GOOGLE_API_KEY,
-        "X-Goog-FieldMask": "routes.optimizedIntermediateWaypointIndex,routes.duration,routes.distanceMeters,routes.legs.duration,routes.legs.distanceMeters,routes.legs.startLocation,routes.legs.endLocation",
+        "X-Goog-FieldMask": ROUTES_FIELD_MASK,
     }
     
     try:
-        response = requests.post(
+        response = HTTP_SESSION.post(
             ROUTES_API_URL,
-            json=request_body,
+            data=orjson.dumps(request_body),
             headers=headers,
             timeout=30
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        print(f"Error decoding Routes API response: {e}")
+        return None
     except requests.RequestException as e:
         print(f"Error calling Routes API: {e}")
         if hasattr(e, 'response') and e.response is not None:
@@ -148,6 +169,24 @@ def optimize_route(
         return None
 
 
+def optimize_routes_batch(
+    jobs: list[tuple[tuple[float, float], tuple[float, float], list[tuple[float, float]]]],
+) -> list[dict | None]:
+    """
+    Optimize several independent routes at once (e.g. one per driver).
+    
+    Args:
+        jobs: List of (origin, destination, waypoints) tuples
+    
+    Returns:
+        optimize_route results in the same order as jobs (None for failed jobs)
+    """
+    # Each job needs its own optimized order, which only computeRoutes
+    # provides, so overlap the requests on the shared session instead
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return list(executor.map(lambda job: optimize_route(*job), jobs))
+
+
 def generate_google_maps_url(
     origin: tuple[float, float],
     destination: tuple[float, float],
@@ -163,6 +202,12 @@ def generate_google_maps_url(
     return base_url + "/".join(path_parts)
 
 
+def parse_duration(duration: str) -> int:
+    """Parse a Routes API duration string like "1234s" into seconds."""
+    return int(duration[:-1]) if duration else 0
+
+
+@lru_cache(maxsize=1024)
 def format_duration(seconds: int) -> str:
     """Format seconds into human-readable duration."""
     hours = seconds // 3600
@@ -172,6 +217,7 @@ def format_duration(seconds: int) -> str:
     return f"{minutes}min"
 
 
+@lru_cache(maxsize=1024)
 def format_distance(meters: int) -> str:
     """Format meters into human-readable distance."""
     if meters >= 1000:
@@ -252,10 +298,13 @@ Examples:
         print(f"Error: Could not parse end URL: {args.end}")
         sys.exit(1)
     
+    # Resolve stop URLs concurrently (short links each need a redirect round trip)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        stop_coords = list(executor.map(extract_coords_from_url, stop_urls))
+    
     waypoints = []
     original_urls = []
-    for url in stop_urls:
-        coords = extract_coords_from_url(url)
+    for url, coords in zip(stop_urls, stop_coords):
         if coords:
             waypoints.append(coords)
             original_urls.append(url)
@@ -288,10 +337,12 @@ Examples:
     ordered_waypoints = [waypoints[i] for i in optimized_order]
     ordered_urls = [original_urls[i] for i in optimized_order]
     
-    # Calculate totals
+    # Calculate totals and per-leg metrics once
     total_distance = route.get("distanceMeters", 0)
-    total_duration_str = route.get("duration", "0s")
-    total_duration = int(total_duration_str.rstrip("s"))
+    total_duration = parse_duration(route.get("duration", "0s"))
+    legs = route.get("legs", [])
+    leg_distances = [leg.get("distanceMeters", 0) for leg in legs]
+    leg_durations = [parse_duration(leg.get("duration", "0s")) for leg in legs]
     
     if args.json:
         output = {
@@ -307,40 +358,42 @@ Examples:
         }
         print(json.dumps(output, indent=2))
     else:
-        print("=" * 60)
-        print("OPTIMIZED ROUTE")
-        print("=" * 60)
-        print()
-        print(f"START: {origin[0]:.6f}, {origin[1]:.6f}")
-        print()
+        # Format each leg once, then write the whole report in one call
+        leg_summaries = [
+            f"Distance: {format_distance(meters)}, Time: {format_duration(seconds)}"
+            for meters, seconds in zip(leg_distances, leg_durations)
+        ]
         
-        legs = route.get("legs", [])
-        for i, (coords, url) in enumerate(zip(ordered_waypoints, ordered_urls)):
-            print(f"  Stop {i + 1}: {coords[0]:.6f}, {coords[1]:.6f}")
-            if i < len(legs):
-                leg = legs[i]
-                leg_dist = leg.get("distanceMeters", 0)
-                leg_dur_str = leg.get("duration", "0s")
-                leg_dur = int(leg_dur_str.rstrip("s"))
-                print(f"           Distance: {format_distance(leg_dist)}, Time: {format_duration(leg_dur)}")
-            print()
+        out = [
+            "=" * 60,
+            "OPTIMIZED ROUTE",
+            "=" * 60,
+            "",
+            f"START: {origin[0]:.6f}, {origin[1]:.6f}",
+            "",
+        ]
         
-        print(f"END: {destination[0]:.6f}, {destination[1]:.6f}")
-        if legs:
-            last_leg = legs[-1]
-            leg_dist = last_leg.get("distanceMeters", 0)
-            leg_dur_str = last_leg.get("duration", "0s")
-            leg_dur = int(leg_dur_str.rstrip("s"))
-            print(f"     Distance: {format_distance(leg_dist)}, Time: {format_duration(leg_dur)}")
-        print()
-        print("-" * 60)
-        print(f"TOTAL DISTANCE: {format_distance(total_distance)}")
-        print(f"TOTAL TIME: {format_duration(total_duration)}")
-        print("-" * 60)
-        print()
-        print("Google Maps URL:")
-        print(generate_google_maps_url(origin, destination, ordered_waypoints))
-
+        for i, coords in enumerate(ordered_waypoints):
+            out.append(f"  Stop {i + 1}: {coords[0]:.6f}, {coords[1]:.6f}")
+            if i < len(leg_summaries):
+                out.append(f"           {leg_summaries[i]}")
+            out.append("")
+        
+        out.append(f"END: {destination[0]:.6f}, {destination[1]:.6f}")
+        if leg_summaries:
+            out.append(f"     {leg_summaries[-1]}")
+        out.extend([
+            "",
+            "-" * 60,
+            f"TOTAL DISTANCE: {format_distance(total_distance)}",
+            f"TOTAL TIME: {format_duration(total_duration)}",
+            "-" * 60,
+            "",
+            "Google Maps URL:",
+            generate_google_maps_url(origin, destination, ordered_waypoints),
+        ])
+        sys.stdout.write("\n".join(out))
+        sys.stdout.write("\n")
 
 if __name__ == "__main__":
     main()
@@ -6,12 +6,17 @@ Uses gspread with service account authentication.
 import os
 import re
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional
 import gspread
 import requests
+from gspread.utils import rowcol_to_a1
 from google.oauth2.service_account import Credentials
 
+from urls import SHORT_URL_RE, find_place_or_center, resolve_short_url
+
 # Sheet column names
 SHEET_COLUMNS = [
     "bsale_id",
@@ -30,6 +35,40 @@ SHEET_COLUMNS = [
     "last_updated"
 ]
 
+# Field name -> sheet column index (1-based)
+COLUMN_MAP = {col: idx + 1 for idx, col in enumerate(SHEET_COLUMNS)}
+
+# Bsale-synced fields; maps_link, lat, lng, verified and last_updated are
+# managed by the verification workflow instead
+DETAIL_FIELDS = frozenset(("name", "company", "phone", "address", "district", "city"))
+
+# A1 column letter for each sheet column, in SHEET_COLUMNS order
+COLUMN_LETTERS = [rowcol_to_a1(1, idx + 1)[:-1] for idx in range(len(SHEET_COLUMNS))]
+
+# Google Maps q=lat,lng links (place pin and map center are in urls.py)
+QUERY_COORDS_RE = re.compile(r"[?&]q=(-?\d+\.?\d*),(-?\d+\.?\d*)")
+
+# Sheet clients are re-read at most every CLIENTS_CACHE_TTL seconds;
+# writes made through this module drop the cached copy
+CLIENTS_CACHE_TTL = 30  # seconds
+CLIENTS_SNAPSHOT = None
+
+# Raw sheet values from the last full read, shared by the bulk sync steps
+# (existing-ID scan, detail diff, append) so one sync reads the sheet once.
+# Never mutated in place: writes swap in a patched copy, so readers on other
+# threads keep a consistent list
+SHEET_VALUES = None
+
+# Large writes are split into requests of at most SHEETS_WRITE_CHUNK rows
+# (appends) or ranges (updates), well under the Sheets API request size limits;
+# update chunks are sent SHEETS_WRITE_WORKERS at a time
+SHEETS_WRITE_CHUNK = 500
+SHEETS_WRITE_WORKERS = 4
+
+# Clients are bucketed by geohash cell (level 6 is about 1.2 km x 0.6 km)
+GEOHASH_PRECISION = 6
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
 # Google Sheets API scopes
 SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets',
@@ -115,10 +154,9 @@ def expand_short_url(url: str) -> str:
     url = url.strip()
     
     # Check if it's a short link that needs expansion
-    if "goo.gl" in url or "maps.app" in url:
+    if SHORT_URL_RE.match(url):
         try:
-            response = requests.head(url, allow_redirects=True, timeout=10)
-            return response.url
+            return resolve_short_url(url)
         except requests.RequestException as e:
             print(f"Error expanding short URL: {e}")
             return url
@@ -143,95 +181,218 @@ def extract_coords_from_maps_link(url: str, expand: bool = False) -> tuple[Optio
     if expand:
         url = expand_short_url(url)
     
-    # Pattern: !3d and !4d (actual place coordinates)
-    place_pattern = r"!3d(-?\d+\.?\d*)!4d(-?\d+\.?\d*)"
-    match = re.search(place_pattern, url)
-    if match:
-        return float(match.group(1)), float(match.group(2))
-    
-    # Pattern: @lat,lng (map center)
-    at_pattern = r"@(-?\d+\.?\d*),(-?\d+\.?\d*)"
-    match = re.search(at_pattern, url)
-    if match:
-        return float(match.group(1)), float(match.group(2))
+    # Pattern: !3d and !4d (actual place coordinates), else @lat,lng (map center)
+    coords = find_place_or_center(url)
+    if coords:
+        return coords
     
     # Pattern: query params q=lat,lng
-    query_pattern = r"[?&]q=(-?\d+\.?\d*),(-?\d+\.?\d*)"
-    match = re.search(query_pattern, url)
+    match = QUERY_COORDS_RE.search(url)
     if match:
         return float(match.group(1)), float(match.group(2))
     
     return None, None
 
 
+def encode_geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Encode coordinates as a geohash string.
+    Bits alternate longitude/latitude, five bits per character.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Even bits refine longitude
+    
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            bounds[0] = mid
+        else:
+            bits <<= 1
+            bounds[1] = mid
+        even = not even
+        
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    
+    return "".join(chars)
+
+
 def get_all_clients() -> list[dict]:
+    """
+    Get all clients from the Google Sheet.
+    Returns a list of client dictionaries (cached for CLIENTS_CACHE_TTL seconds).
+    """
+    return get_clients_snapshot()["clients"]
+
+
+def get_clients_snapshot() -> dict:
+    """
+    Get the cached client list together with its index by bsale_id.
+    Re-reads the sheet once the cache expires; failed reads are not cached.
+    """
+    global CLIENTS_SNAPSHOT
+    
+    snapshot = CLIENTS_SNAPSHOT
+    if snapshot and snapshot["expires_at"] > time.time():
+        return snapshot
+    
+    clients = fetch_all_clients()
+    if clients is None:
+        return {"clients": [], "by_id": {}, "by_cell": {}}
+    
+    by_id = {}
+    by_cell = {}
+    for client in clients:
+        by_id.setdefault(str(client.get("bsale_id")), client)
+        # Geohash cells only live in this index, not in the client dicts
+        # that are sent to the browser
+        if client["lat"] is not None and client["lng"] is not None:
+            cell = encode_geohash(client["lat"], client["lng"])
+            by_cell.setdefault(cell, []).append(client)
+    
+    snapshot = {
+        "expires_at": time.time() + CLIENTS_CACHE_TTL,
+        "clients": clients,
+        "by_id": by_id,
+        "by_cell": by_cell
+    }
+    CLIENTS_SNAPSHOT = snapshot
+    return snapshot
+
+
+def invalidate_clients_cache(keep_sheet_values: bool = False):
+    """
+    Drop the cached clients so the next read sees changes written to the sheet.
+    keep_sheet_values keeps the raw values when the caller already patched them.
+    """
+    global CLIENTS_SNAPSHOT, SHEET_VALUES
+    CLIENTS_SNAPSHOT = None
+    if not keep_sheet_values:
+        SHEET_VALUES = None
+
+
+def get_sheet_values(worksheet: gspread.Worksheet) -> list[list[str]]:
+    """
+    Get every row of the sheet (header included) as raw strings.
+    Reuses the last full read for up to CLIENTS_CACHE_TTL seconds.
+    """
+    memo = SHEET_VALUES
+    if memo and memo["expires_at"] > time.time():
+        return memo["values"]
+    
+    return read_sheet_values(worksheet)
+
+
+def read_sheet_values(worksheet: gspread.Worksheet) -> list[list[str]]:
+    """Read every row of the sheet and remember it for get_sheet_values."""
+    global SHEET_VALUES
+    
+    values = worksheet.get_all_values()
+    SHEET_VALUES = {"expires_at": time.time() + CLIENTS_CACHE_TTL, "values": values}
+    return values
+
+
+def replace_sheet_values(old_values: list[list[str]], new_values: list[list[str]]) -> bool:
+    """
+    Swap a patched copy of the shared sheet values in for old_values.
+    Returns False (leaving the memo alone) if it no longer holds old_values.
+    """
+    global SHEET_VALUES
+    
+    memo = SHEET_VALUES
+    if not memo or memo["values"] is not old_values:
+        return False
+    SHEET_VALUES = {"expires_at": memo["expires_at"], "values": new_values}
+    return True
+
+
+def parse_coordinate(value: str) -> Optional[float]:
+    """
+    Parse a lat/lng cell into a float.
+    Empty cells return None without raising; only malformed text hits the except.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_client_row(row: list[str]) -> dict:
+    """
+    Convert a raw sheet row (in SHEET_COLUMNS order) to a client dictionary.
+    """
+    column_count = len(SHEET_COLUMNS)
+    
+    # Trailing empty cells are omitted by the API, pad them back
+    if len(row) < column_count:
+        row = row + [""] * (column_count - len(row))
+    client = dict(zip(SHEET_COLUMNS, row))
+    
+    # Keep bsale_id numeric, as get_all_records used to return it
+    if client["bsale_id"].isdigit():
+        client["bsale_id"] = int(client["bsale_id"])
+    
+    # Parse lat/lng to float if present
+    client["lat"] = parse_coordinate(client["lat"])
+    client["lng"] = parse_coordinate(client["lng"])
+    
+    return client
+
+
+def fetch_all_clients() -> Optional[list[dict]]:
     """
     Fetch all clients from the Google Sheet.
-    Returns a list of client dictionaries.
+    Returns a list of client dictionaries, or None if the sheet can't be read.
     """
     worksheet = get_worksheet()
     if not worksheet:
-        return []
+        return None
     
     try:
-        # Get all records (excludes header row)
-        records = worksheet.get_all_records()
-        
-        clients = []
-        for record in records:
-            # Convert to our expected format
-            client = {
-                "bsale_id": record.get("bsale_id", ""),
-                "name": record.get("name", ""),
-                "company": record.get("company", ""),
-                "phone": record.get("phone", ""),
-                "address": record.get("address", ""),
-                "clean_address": record.get("clean_address", ""),
-                "district": record.get("district", ""),
-                "verified_district": record.get("verified_district", ""),
-                "city": record.get("city", ""),
-                "maps_link": record.get("maps_link", ""),
-                "lat": record.get("lat", ""),
-                "lng": record.get("lng", ""),
-                "verified": record.get("verified", ""),
-                "last_updated": record.get("last_updated", "")
-            }
-            
-            # Parse lat/lng to float if present
-            if client["lat"]:
-                try:
-                    client["lat"] = float(client["lat"])
-                except (ValueError, TypeError):
-                    client["lat"] = None
-            else:
-                client["lat"] = None
-                
-            if client["lng"]:
-                try:
-                    client["lng"] = float(client["lng"])
-                except (ValueError, TypeError):
-                    client["lng"] = None
-            else:
-                client["lng"] = None
-            
-            clients.append(client)
-        
-        return clients
+        # Raw cell values; rows are positional in SHEET_COLUMNS order
+        values = read_sheet_values(worksheet)
+        return [parse_client_row(row) for row in values[1:]]
     
     except Exception as e:
         print(f"Error fetching clients from sheet: {e}")
-        return []
+        return None
 
 
 def get_client_by_bsale_id(bsale_id: int) -> Optional[dict]:
     """
     Find a specific client by their Bsale ID.
+    A cold lookup reads the whole sheet once and fills the cached clients,
+    so later lookups within CLIENTS_CACHE_TTL cost no API calls.
     """
-    clients = get_all_clients()
-    for client in clients:
-        if str(client.get("bsale_id")) == str(bsale_id):
-            return client
-    return None
+    return get_clients_snapshot()["by_id"].get(str(bsale_id))
+
+
+def get_clients_in_cell(geohash: str) -> list[dict]:
+    """
+    Get the clients located in a geohash cell.
+    Pass a shorter prefix (level 5 or 4) to search a wider area.
+    """
+    by_cell = get_clients_snapshot()["by_cell"]
+    if len(geohash) >= GEOHASH_PRECISION:
+        return list(by_cell.get(geohash[:GEOHASH_PRECISION], []))
+    
+    return [
+        client
+        for cell, cell_clients in by_cell.items()
+        if cell.startswith(geohash)
+        for client in cell_clients
+    ]
 
 
 def find_client_row(worksheet: gspread.Worksheet, bsale_id: int) -> Optional[int]:
@@ -270,30 +431,35 @@ def update_client(bsale_id: int, updates: dict) -> bool:
             print(f"Client {bsale_id} not found in sheet")
             return False
         
-        # Map field names to column indices (1-based)
-        column_map = {col: idx + 1 for idx, col in enumerate(SHEET_COLUMNS)}
-        
         # If updating maps_link, also extract and update lat/lng
         if "maps_link" in updates:
             lat, lng = extract_coords_from_maps_link(updates["maps_link"])
             updates["lat"] = lat if lat else ""
             updates["lng"] = lng if lng else ""
         
-        # Update each field
-        for field, value in updates.items():
-            if field in column_map:
-                col_num = column_map[field]
-                worksheet.update_cell(row_num, col_num, str(value) if value is not None else "")
-        
-        # Always update last_updated
-        last_updated_col = column_map["last_updated"]
-        worksheet.update_cell(row_num, last_updated_col, datetime.now().isoformat())
+        # Update each field, plus last_updated, in a single request
+        cells_to_update = [
+            {
+                "range": f"{COLUMN_LETTERS[COLUMN_MAP[field] - 1]}{row_num}",
+                "values": [[str(value) if value is not None else ""]]
+            }
+            for field, value in updates.items()
+            if field in COLUMN_MAP
+        ]
+        cells_to_update.append({
+            "range": f"{COLUMN_LETTERS[COLUMN_MAP['last_updated'] - 1]}{row_num}",
+            "values": [[datetime.now().isoformat()]]
+        })
+        # USER_ENTERED matches how update_cell stored values (numbers stay numbers)
+        worksheet.batch_update(cells_to_update, value_input_option="USER_ENTERED")
         
         return True
     
     except Exception as e:
         print(f"Error updating client {bsale_id}: {e}")
         return False
+    finally:
+        invalidate_clients_cache()
 
 
 def add_clients(clients: list[dict]) -> int:
@@ -311,12 +477,15 @@ def add_clients(clients: list[dict]) -> int:
     if not worksheet:
         return 0
     
+    values = None
+    values_in_sync = False  # True once the shared values match the sheet again
+    
     try:
-        # Get existing bsale_ids
+        # Get existing bsale_ids (shares the sync's earlier read when fresh)
         existing_ids = set()
         try:
-            existing_values = worksheet.col_values(1)[1:]  # Skip header
-            existing_ids = {str(v) for v in existing_values if v}
+            values = get_sheet_values(worksheet)
+            existing_ids = {row[0] for row in values[1:] if row and row[0]}
         except Exception:
             pass
         
@@ -353,15 +522,24 @@ def add_clients(clients: list[dict]) -> int:
             rows_to_add.append(row)
             added += 1
         
-        # Batch append all new rows
-        if rows_to_add:
-            worksheet.append_rows(rows_to_add)
+        # Batch append all new rows, one request per chunk (appends stay in order)
+        for start in range(0, len(rows_to_add), SHEETS_WRITE_CHUNK):
+            worksheet.append_rows(rows_to_add[start:start + SHEETS_WRITE_CHUNK])
+        
+        # Mirror the append in the shared values so the next batch of an
+        # incremental sync doesn't have to re-read the sheet
+        if values is not None:
+            values_in_sync = replace_sheet_values(
+                values, values + [[str(v) for v in row] for row in rows_to_add]
+            )
         
         return added
     
     except Exception as e:
         print(f"Error adding clients to sheet: {e}")
         return 0
+    finally:
+        invalidate_clients_cache(keep_sheet_values=values_in_sync)
 
 
 def verify_client(bsale_id: int, clean_address: str = None, verified_district: str = None) -> bool:
@@ -428,13 +606,49 @@ def get_existing_bsale_ids() -> set[str]:
         return set()
     
     try:
-        values = worksheet.col_values(1)[1:]  # Skip header
-        return {str(v) for v in values if v}
+        values = get_sheet_values(worksheet)
+        return {row[0] for row in values[1:] if row and row[0]}
     except Exception as e:
         print(f"Error getting existing Bsale IDs: {e}")
         return set()
 
 
+def get_address_links() -> dict[tuple[str, str, str], str]:
+    """
+    Get the maps links already in the sheet, keyed by (address, city, district).
+    Links from verified rows win over geocoded ones for the same address.
+    """
+    worksheet = get_worksheet()
+    if not worksheet:
+        return {}
+    
+    address_col = COLUMN_MAP["address"] - 1
+    city_col = COLUMN_MAP["city"] - 1
+    district_col = COLUMN_MAP["district"] - 1
+    link_col = COLUMN_MAP["maps_link"] - 1
+    verified_col = COLUMN_MAP["verified"] - 1
+    
+    try:
+        values = get_sheet_values(worksheet)
+    except Exception as e:
+        print(f"Error getting address links: {e}")
+        return {}
+    
+    links = {}
+    verified_keys = set()
+    for row in values[1:]:
+        if len(row) <= link_col or not row[address_col] or not row[link_col]:
+            continue
+        key = (row[address_col], row[city_col], row[district_col])
+        verified = len(row) > verified_col and row[verified_col] == "yes"
+        if key not in links or (verified and key not in verified_keys):
+            links[key] = row[link_col]
+            if verified:
+                verified_keys.add(key)
+    
+    return links
+
+
 def update_client_details(bsale_id: int, details: dict) -> bool:
     """
     Update a client's basic details (name, company, phone, address, district, city).
@@ -457,24 +671,26 @@ def update_client_details(bsale_id: int, details: dict) -> bool:
         if not row_num:
             return False
         
-        # Only allow updating these fields (not maps_link, lat, lng, verified, last_updated)
-        allowed_fields = ["name", "company", "phone", "address", "district", "city"]
-        
-        # Map field names to column indices (1-based)
-        column_map = {col: idx + 1 for idx, col in enumerate(SHEET_COLUMNS)}
-        
-        updates_made = False
-        for field, value in details.items():
-            if field in allowed_fields and field in column_map:
-                col_num = column_map[field]
-                worksheet.update_cell(row_num, col_num, str(value) if value is not None else "")
-                updates_made = True
+        # Only detail fields may be updated here (see DETAIL_FIELDS)
+        cells_to_update = [
+            {
+                "range": f"{COLUMN_LETTERS[COLUMN_MAP[field] - 1]}{row_num}",
+                "values": [[str(value) if value is not None else ""]]
+            }
+            for field, value in details.items()
+            if field in DETAIL_FIELDS
+        ]
+        if not cells_to_update:
+            return False
         
-        return updates_made
+        worksheet.batch_update(cells_to_update, value_input_option="USER_ENTERED")
+        return True
     
     except Exception as e:
         print(f"Error updating client details {bsale_id}: {e}")
         return False
+    finally:
+        invalidate_clients_cache()
 
 
 def batch_update_client_details(clients: list[dict]) -> int:
@@ -493,32 +709,28 @@ def batch_update_client_details(clients: list[dict]) -> int:
     if not worksheet:
         return 0
     
-    column_map = {col: idx + 1 for idx, col in enumerate(SHEET_COLUMNS)}
+    values_in_sync = False  # True once the shared values match the sheet again
     
     try:
-        # Get all existing data to compare (1 read request)
+        # Get all existing data to compare (1 read request, or none when
+        # the sync just read the sheet)
         print("  Fetching existing data for comparison...")
-        all_records = worksheet.get_all_records()
+        values = get_sheet_values(worksheet)
         existing_map = {}
-        for idx, record in enumerate(all_records):
-            bsale_id = str(record.get("bsale_id", ""))
-            if bsale_id:
-                existing_map[bsale_id] = {
-                    "row": idx + 2,  # +2 because row 1 is header, enumerate is 0-based
-                    "data": record
-                }
+        for idx, row in enumerate(values[1:]):
+            if row and row[0]:
+                existing_map[row[0]] = (idx + 2, row)  # +2 because row 1 is header, enumerate is 0-based
         
         updated = 0
         cells_to_update = []
+        written = []  # (row index, column index, value) to patch into the shared values
         
         for client in clients:
             bsale_id = str(client.get("bsale_id", ""))
             if bsale_id not in existing_map:
                 continue
             
-            existing = existing_map[bsale_id]
-            row_num = existing["row"]
-            existing_data = existing["data"]
+            row_num, existing_row = existing_map[bsale_id]
             
             # Build name from firstName/lastName
             new_name = f"{client.get('firstName', '')} {client.get('lastName', '')}".strip()
@@ -535,14 +747,15 @@ def batch_update_client_details(clients: list[dict]) -> int:
             
             client_needs_update = False
             for field, new_value in field_values.items():
-                old_value = str(existing_data.get(field, ""))
+                col_num = COLUMN_MAP[field]
+                old_value = existing_row[col_num - 1] if col_num <= len(existing_row) else ""
                 if str(new_value) != old_value:
                     client_needs_update = True
-                    col_num = column_map[field]
                     cells_to_update.append({
-                        "range": f"{chr(64 + col_num)}{row_num}",
+                        "range": f"{COLUMN_LETTERS[col_num - 1]}{row_num}",
                         "values": [[str(new_value)]]
                     })
+                    written.append((row_num - 1, col_num - 1, str(new_value)))
             
             if client_needs_update:
                 updated += 1
@@ -551,16 +764,39 @@ def batch_update_client_details(clients: list[dict]) -> int:
         
         # If nothing changed, skip the write entirely
         if not cells_to_update:
+            values_in_sync = True
             return 0
         
-        # Use gspread's batch_update for a single API call
+        # Use gspread's batch_update, one API call per chunk of ranges
         # Format: list of dicts with 'range' and 'values' keys
-        if cells_to_update:
-            worksheet.batch_update(cells_to_update)
+        chunks = [
+            cells_to_update[start:start + SHEETS_WRITE_CHUNK]
+            for start in range(0, len(cells_to_update), SHEETS_WRITE_CHUNK)
+        ]
+        if len(chunks) == 1:
+            worksheet.batch_update(chunks[0])
+        else:
+            # Ranges don't overlap, so chunks can be written concurrently
+            with ThreadPoolExecutor(max_workers=SHEETS_WRITE_WORKERS) as executor:
+                list(executor.map(worksheet.batch_update, chunks))
+        
+        # Mirror the write in a copy of the shared values so add_clients can
+        # reuse them; only the changed rows are copied
+        new_values = list(values)
+        for row_idx, col_idx, value in written:
+            row = new_values[row_idx]
+            if row is values[row_idx]:
+                row = new_values[row_idx] = list(row)
+            if len(row) <= col_idx:
+                row.extend([""] * (col_idx + 1 - len(row)))
+            row[col_idx] = value
+        values_in_sync = replace_sheet_values(values, new_values)
         
         return updated
     
     except Exception as e:
         print(f"Error batch updating clients: {e}")
         return 0
+    finally:
+        invalidate_clients_cache(keep_sheet_values=values_in_sync)
 
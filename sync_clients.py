@@ -8,23 +8,35 @@ Usage:
     python sync_clients.py --new-only   # Only add new clients
 """
 
+import json
 import os
+import random
 import re
 import sys
+import threading
 import time
+import unicodedata
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 load_dotenv()
 
+from cache import cache_get, cache_set
+
 # Import sheets module
 from sheets import (
     get_worksheet,
     add_clients,
     get_existing_bsale_ids,
+    get_address_links,
     batch_update_client_details,
     SHEET_COLUMNS
 )
@@ -34,6 +46,115 @@ BSALE_ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 BSALE_API_URL = "https://api.bsale.io/v1"
 GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 
+# Apartment/office details that confuse geocoding ("Dpto 301", "Oficina 502", "Int. 5")
+APARTMENT_RE = re.compile(
+    r',?\s*(?:Dpto\.?|Departamento|Oficina|Dpto/Oficina|Dept\.?|Int\.?|Piso|Torre)\s*[A-Za-z0-9\-]+',
+    re.IGNORECASE
+)
+
+# Address normalization for cache keys: punctuation, and spelled-out street
+# types mapped to the abbreviations most addresses already use
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+STREET_TYPES = {"AVENIDA": "AV", "JIRON": "JR", "CALLE": "CA"}
+STREET_TYPE_RE = re.compile(r'\b(?:' + '|'.join(STREET_TYPES) + r')\b')
+
+# Bsale clients per page, and pages fetched concurrently
+BSALE_PAGE_SIZE = 50
+BSALE_PAGE_WORKERS = 8
+
+# Concurrent geocoding requests; the request rate is capped separately below
+GEOCODE_WORKERS = 16
+
+# Request rate caps shared by all worker threads (Google allows 50 QPS for geocoding)
+GEOCODE_RATE_LIMIT = {"interval": 1 / 40, "next_at": 0.0, "lock": threading.Lock()}
+BSALE_RATE_LIMIT = {"interval": 1 / 10, "next_at": 0.0, "lock": threading.Lock()}
+
+# Shared HTTP sessions: reuse TCP/TLS connections across pages and geocodes
+# and retry transient errors (urllib3 only retries idempotent methods on bad status).
+# Pools hold one connection per worker so none is dropped and re-handshaked.
+BSALE_SESSION = requests.Session()
+BSALE_SESSION.headers.update({
+    "access_token": BSALE_ACCESS_TOKEN,
+    "Content-Type": "application/json"
+})
+BSALE_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=BSALE_PAGE_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=GEOCODE_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# Google reports throttling in the response body (HTTP 200); those geocodes
+# are retried with exponential backoff plus jitter instead of being dropped
+GEOCODE_THROTTLED_STATUSES = {"OVER_QUERY_LIMIT", "RATE_LIMIT_EXCEEDED"}
+GEOCODE_MAX_ATTEMPTS = 5
+
+# Geocoded clients are written to the sheet in batches of this size while
+# the rest are still being geocoded, so a crash only loses the current batch
+ADD_BATCH_SIZE = 100
+
+# Seconds between geocoding progress lines
+PROGRESS_INTERVAL = 1
+
+# Sheet writes run here so they overlap with geocoding; one worker keeps
+# them in order and off each other's shared sheet values
+SHEETS_POOL = ThreadPoolExecutor(max_workers=1)
+
+# Successful geocoding results by bsale_id, saved every CHECKPOINT_EVERY
+# clients so a rerun after a crash doesn't geocode the unsaved batch again.
+# The CLI and the web sync keep separate files so they never resume each
+# other's run; each removes its file once every batch is in the sheet.
+SYNC_CHECKPOINT_FILE = Path(__file__).parent / "sync_checkpoint.json"
+WEB_SYNC_CHECKPOINT_FILE = Path(__file__).parent / "sync_checkpoint_web.json"
+CHECKPOINT_EVERY = 50
+
+
+def wait_for_rate_limit(limit: dict):
+    """
+    Block until the next request slot of a rate limit is free.
+    Slots are handed out under the lock, so threads are spaced by limit["interval"]
+    no matter how long each request takes.
+    """
+    with limit["lock"]:
+        now = time.monotonic()
+        slot = max(now, limit["next_at"])
+        limit["next_at"] = slot + limit["interval"]
+    
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def normalize_address(text: str) -> str:
+    """
+    Normalize an address for comparison: no accents or punctuation, uppercase,
+    single spaces, and street types abbreviated ("Av. Javier Prado" and
+    "AVENIDA JAVIER PRADO" both become "AV JAVIER PRADO").
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).upper()
+    text = " ".join(PUNCTUATION_RE.sub(" ", text).split())
+    return STREET_TYPE_RE.sub(lambda m: STREET_TYPES[m.group()], text)
+
+
+def clean_address(address: str) -> str:
+    """Remove apartment/office info that confuses geocoding ("Dpto 301", "Int. 5")."""
+    return APARTMENT_RE.sub('', address).strip().rstrip(',').strip()
+
+
+def geocode_cache_key(address: str, city: str = "", district: str = "") -> str:
+    """
+    Build the "address_links" cache key for a raw address.
+    The address is cleaned first and all parts are normalized, so clients in
+    the same building and trivially different spellings share an entry.
+    """
+    return "|".join(normalize_address(part) for part in (clean_address(address), district, city))
+
 
 def geocode_address(address: str, city: str = "", district: str = "") -> str:
     """
@@ -43,26 +164,18 @@ def geocode_address(address: str, city: str = "", district: str = "") -> str:
     if not GOOGLE_API_KEY or not address:
         return ""
     
-    # Clean address: remove apartment/office info that confuses geocoding
-    clean_address = address
-    clean_address = re.sub(
-        r',?\s*(Dpto\.?|Departamento|Oficina|Dpto/Oficina|Dept\.?|Int\.?|Piso|Torre)\s*[A-Za-z0-9\-]+',
-        '',
-        clean_address,
-        flags=re.IGNORECASE
-    )
-    clean_address = clean_address.strip().rstrip(',').strip()
-    
-    if not clean_address:
+    cleaned = clean_address(address)
+    if not cleaned:
         return ""
     
+    # Addresses geocoded by earlier syncs are reused from the persistent cache
+    cache_key = geocode_cache_key(address, city, district)
+    cached = cache_get("address_links", cache_key)
+    if cached:
+        return cached
+    
     # Build full address string with district for accuracy
-    full_address = clean_address
-    if district:
-        full_address += f", {district}"
-    if city:
-        full_address += f", {city}"
-    full_address += ", Peru"
+    full_address = ", ".join(p for p in (cleaned, district, city, "Peru") if p)
     
     url = "https://maps.googleapis.com/maps/api/geocode/json"
     params = {
@@ -73,96 +186,229 @@ def geocode_address(address: str, city: str = "", district: str = "") -> str:
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        for attempt in range(GEOCODE_MAX_ATTEMPTS):
+            wait_for_rate_limit(GEOCODE_RATE_LIMIT)
+            response = HTTP_SESSION.get(url, params=params, timeout=10)
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+            
+            if data.get("status") not in GEOCODE_THROTTLED_STATUSES:
+                break
+            if attempt < GEOCODE_MAX_ATTEMPTS - 1:
+                time.sleep(2 ** attempt + random.random())
+        else:
+            print(f"  Geocoding throttled for: {full_address} - gave up after {GEOCODE_MAX_ATTEMPTS} attempts")
+            return ""
         
         if data.get("status") == "OK" and data.get("results"):
             location = data["results"][0]["geometry"]["location"]
             lat = location["lat"]
             lng = location["lng"]
             # Return a Google Maps URL with the coordinates
-            return f"https://www.google.com/maps?q={lat},{lng}"
+            maps_link = f"https://www.google.com/maps?q={lat},{lng}"
+            cache_set("address_links", cache_key, maps_link)
+            return maps_link
         
         print(f"  Geocoding failed for: {full_address} - Status: {data.get('status')}")
         return ""
     
-    except requests.RequestException as e:
+    except (requests.RequestException, orjson.JSONDecodeError) as e:
         print(f"  Geocoding error for: {full_address} - {e}")
         return ""
 
 
+def load_checkpoint(checkpoint_file: Path) -> dict[str, str]:
+    """Load maps links saved by an interrupted sync, keyed by bsale_id."""
+    if not checkpoint_file.exists():
+        return {}
+    
+    try:
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get("maps_links", {})
+    except (IOError, ValueError) as e:
+        print(f"Error loading sync checkpoint: {e}")
+        return {}
+
+
+def save_checkpoint(checkpoint_file: Path, maps_links: dict[str, str]):
+    """Atomically write the geocoding checkpoint (write to a temp file, then rename)."""
+    tmp_file = checkpoint_file.with_suffix(".tmp")
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"maps_links": maps_links}, f, ensure_ascii=False)
+        os.replace(tmp_file, checkpoint_file)
+    except IOError as e:
+        print(f"Error saving sync checkpoint: {e}")
+
+
+def geocode_clients(
+    clients: list[dict],
+    on_progress=None,
+    on_batch=None,
+    checkpoint_file: Path = SYNC_CHECKPOINT_FILE
+) -> int:
+    """
+    Geocode clients' addresses concurrently, setting client["maps_link"].
+    Addresses that already have a maps link in the sheet reuse it instead,
+    and clients finished by an interrupted run reuse its checkpoint.
+    
+    Args:
+        clients: Client dicts with address, city and district
+        on_progress: Optional callback(done, total, geocoded) called as results arrive
+        on_batch: Optional callback(batch) called with every ADD_BATCH_SIZE
+            geocoded clients (and the remainder at the end), in order,
+            while later clients are still being geocoded
+        checkpoint_file: Where progress is saved; the caller removes it once
+            every batch has been written
+    
+    Returns:
+        Number of clients geocoded successfully
+    """
+    def geocode_client(client: dict) -> str:
+        address = client.get("address", "")
+        if not address:
+            return ""
+        return geocode_address(address, client.get("city", ""), client.get("district", ""))
+    
+    # Links already in the sheet (usually from the sync's earlier read, so free)
+    sheet_links = {
+        geocode_cache_key(address, city, district): maps_link
+        for (address, city, district), maps_link in get_address_links().items()
+    }
+    
+    if not GOOGLE_API_KEY:
+        print("  Warning: GOOGLE_MAPS_API_KEY not configured, addresses won't be geocoded")
+    
+    checkpoint = load_checkpoint(checkpoint_file)
+    if checkpoint:
+        print(f"  Resuming from checkpoint ({len(checkpoint)} clients already geocoded)")
+    
+    geocoded_count = 0
+    batch = []
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as executor:
+        # Clients sharing an address (same building or business) are
+        # geocoded once per run and share the result
+        pending = {}
+        keys = []
+        for client in clients:
+            key = geocode_cache_key(client.get("address", ""), client.get("city", ""), client.get("district", ""))
+            resumed = str(client.get("bsale_id")) in checkpoint
+            if not resumed and key not in pending and key not in sheet_links:
+                pending[key] = executor.submit(geocode_client, client)
+            keys.append(key)
+        
+        for i, (client, key) in enumerate(zip(clients, keys)):
+            bsale_id = str(client.get("bsale_id"))
+            if bsale_id in checkpoint:
+                maps_link = checkpoint[bsale_id]
+            elif key in sheet_links:
+                maps_link = sheet_links[key]
+            else:
+                maps_link = pending[key].result()
+            client["maps_link"] = maps_link
+            if maps_link:
+                # Failures stay out so a resumed run retries them
+                checkpoint[bsale_id] = maps_link
+                geocoded_count += 1
+            if (i + 1) % CHECKPOINT_EVERY == 0:
+                save_checkpoint(checkpoint_file, checkpoint)
+            if on_progress:
+                on_progress(i + 1, len(clients), geocoded_count)
+            
+            if on_batch:
+                batch.append(client)
+                if len(batch) == ADD_BATCH_SIZE:
+                    on_batch(batch)
+                    batch = []
+    
+    if on_batch and batch:
+        on_batch(batch)
+    
+    return geocoded_count
+
+
+def parse_bsale_client(item: dict) -> dict:
+    """Convert a Bsale API client item to the fields the sync uses."""
+    get = item.get
+    return {
+        "bsale_id": get("id"),
+        "firstName": get("firstName", ""),
+        "lastName": get("lastName", ""),
+        "company": get("company", ""),
+        "phone": get("phone", ""),
+        "address": get("address", ""),
+        "city": get("city", ""),
+        "district": get("district", ""),
+    }
+
+
+def fetch_bsale_page(offset: int) -> list[dict]:
+    """
+    Fetch one page of active Bsale clients starting at offset.
+    Returns the raw API items; raises requests.RequestException on errors.
+    """
+    wait_for_rate_limit(BSALE_RATE_LIMIT)
+    response = BSALE_SESSION.get(
+        f"{BSALE_API_URL}/clients.json",
+        params={"limit": BSALE_PAGE_SIZE, "offset": offset, "state": 0},
+        timeout=30
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content).get("items", [])
+
+
 def fetch_all_bsale_clients() -> list[dict]:
     """
     Fetch all clients from Bsale API with pagination.
+    Pages are fetched concurrently once the total count is known.
     Returns list of client dictionaries.
     """
     if not BSALE_ACCESS_TOKEN:
         print("Error: BSALE_ACCESS_TOKEN not configured")
         return []
     
-    headers = {
-        "access_token": BSALE_ACCESS_TOKEN,
-        "Content-Type": "application/json"
-    }
-    
     clients = []
-    offset = 0
-    limit = 50
     
     # Get total count first
     try:
-        count_response = requests.get(
+        count_response = BSALE_SESSION.get(
             f"{BSALE_API_URL}/clients/count.json",
-            headers=headers,
             timeout=10
         )
         count_response.raise_for_status()
-        total_count = count_response.json().get("count", 0)
+        total_count = orjson.loads(count_response.content).get("count", 0)
         print(f"Total Bsale clients: {total_count}")
-    except requests.RequestException as e:
+    except (requests.RequestException, orjson.JSONDecodeError) as e:
         print(f"Error getting client count: {e}")
         return []
     
-    while True:
-        try:
-            response = requests.get(
-                f"{BSALE_API_URL}/clients.json",
-                headers=headers,
-                params={"limit": limit, "offset": offset, "state": 0},
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            items = data.get("items", [])
-            if not items:
-                break
-            
-            for client in items:
-                clients.append({
-                    "bsale_id": client.get("id"),
-                    "firstName": client.get("firstName", ""),
-                    "lastName": client.get("lastName", ""),
-                    "company": client.get("company", ""),
-                    "phone": client.get("phone", ""),
-                    "address": client.get("address", ""),
-                    "city": client.get("city", ""),
-                    "district": client.get("district", ""),
-                })
+    # Pages are independent, so request them all at once and keep their order
+    offsets = range(0, total_count, BSALE_PAGE_SIZE)
+    items = []
+    with ThreadPoolExecutor(max_workers=BSALE_PAGE_WORKERS) as executor:
+        futures = [executor.submit(fetch_bsale_page, offset) for offset in offsets]
+        for offset, future in zip(offsets, futures):
+            try:
+                items = future.result()
+            except (requests.RequestException, orjson.JSONDecodeError) as e:
+                print(f"Error fetching clients at offset {offset}: {e}")
+                for pending in futures:
+                    pending.cancel()
+                return clients
             
-            offset += len(items)
-            print(f"  Fetched {offset}/{total_count} clients...")
-            
-            if len(items) < limit:
-                break
-            
-            # Rate limiting
-            time.sleep(0.1)
-            
-        except requests.RequestException as e:
+            clients.extend(map(parse_bsale_client, items))
+            print(f"  Fetched {len(clients)}/{total_count} clients...")
+    
+    # Clients created after the count was taken spill past the last page
+    offset = len(offsets) * BSALE_PAGE_SIZE
+    while len(items) == BSALE_PAGE_SIZE:
+        try:
+            items = fetch_bsale_page(offset)
+        except (requests.RequestException, orjson.JSONDecodeError) as e:
             print(f"Error fetching clients at offset {offset}: {e}")
             break
+        clients.extend(map(parse_bsale_client, items))
+        offset += BSALE_PAGE_SIZE
     
     return clients
 
@@ -200,58 +446,79 @@ def sync_clients_to_sheet(new_only: bool = False):
     
     print(f"✓ Fetched {len(bsale_clients)} clients from Bsale")
     
-    # Separate new and existing clients
-    new_clients = [c for c in bsale_clients if str(c.get("bsale_id")) not in existing_ids]
-    existing_clients = [c for c in bsale_clients if str(c.get("bsale_id")) in existing_ids]
+    # Separate new and existing clients in one pass
+    new_clients, existing_clients = [], []
+    for c in bsale_clients:
+        (existing_clients if str(c.get("bsale_id")) in existing_ids else new_clients).append(c)
     
     print(f"  New clients to add: {len(new_clients)}")
     print(f"  Existing clients to update: {len(existing_clients)}")
     
     # ============ UPDATE EXISTING CLIENTS ============
     # Update details (name, company, phone, address, district, city)
-    # but NOT maps_link, lat, lng, verified - those are managed via verification workflow
+    # but NOT maps_link, lat, lng, verified - those are managed via verification workflow.
+    # Runs on SHEETS_POOL so it overlaps with geocoding the new clients.
+    update_future = None
     if existing_clients and not new_only:
         print("\nUpdating existing clients' details...")
-        updated = batch_update_client_details(existing_clients)
-        print(f"✓ Updated {updated} existing clients")
+        update_future = SHEETS_POOL.submit(batch_update_client_details, existing_clients)
     
     # ============ ADD NEW CLIENTS ============
     if not new_clients:
         print("\nNo new clients to add.")
-        if not existing_clients or new_only:
-            print("Sheet is up to date.")
-        return True
-    
-    # Geocode addresses for new clients only
-    print("\nGeocoding addresses for new clients...")
-    geocoded_count = 0
-    
-    for i, client in enumerate(new_clients):
-        address = client.get("address", "")
-        city = client.get("city", "")
-        district = client.get("district", "")
+    else:
+        # Geocode addresses for new clients only, adding them to the sheet in
+        # batches as they are geocoded
+        print("\nGeocoding and adding new clients to Google Sheet...")
+        added = 0
+        submitted = 0
+        add_future = None
+        progress = {"done": 0, "geocoded": 0}
+        geocoding_done = threading.Event()
         
-        if address:
-            maps_link = geocode_address(address, city, district)
-            client["maps_link"] = maps_link
-            if maps_link:
-                geocoded_count += 1
-        else:
-            client["maps_link"] = ""
+        def report_progress(done: int, total: int, geocoded: int):
+            progress["done"] = done
+            progress["geocoded"] = geocoded
         
-        # Progress indicator
-        if (i + 1) % 10 == 0 or i == len(new_clients) - 1:
-            print(f"  Geocoded {i + 1}/{len(new_clients)} ({geocoded_count} successful)")
+        def print_progress():
+            # Prints on a timer so the geocoding loop never waits on stdout
+            while not geocoding_done.wait(PROGRESS_INTERVAL):
+                print(f"  Geocoded {progress['done']}/{len(new_clients)} ({progress['geocoded']} successful)")
         
-        # Rate limiting for geocoding API
-        time.sleep(0.05)
+        def wait_for_add():
+            nonlocal added
+            if add_future:
+                added += add_future.result()
+                print(f"  Added {added} new clients to sheet")
+        
+        def add_batch(batch: list[dict]):
+            # Keep one write in flight so unsaved work stays bounded by a batch
+            nonlocal add_future, submitted
+            wait_for_add()
+            add_future = SHEETS_POOL.submit(add_clients, batch)
+            submitted += len(batch)
+        
+        threading.Thread(target=print_progress, daemon=True).start()
+        try:
+            geocoded_count = geocode_clients(new_clients, on_progress=report_progress, on_batch=add_batch)
+        finally:
+            geocoding_done.set()
+        wait_for_add()
+        
+        # Keep the checkpoint if any batch failed to write, so a rerun resumes
+        if added == submitted:
+            SYNC_CHECKPOINT_FILE.unlink(missing_ok=True)
+        
+        print(f"✓ Geocoding complete: {geocoded_count}/{len(new_clients)} successful")
+        print(f"✓ Added {added} new clients to sheet")
     
-    print(f"✓ Geocoding complete: {geocoded_count}/{len(new_clients)} successful")
+    if update_future:
+        print(f"✓ Updated {update_future.result()} existing clients")
     
-    # Add new clients to sheet
-    print("\nAdding new clients to Google Sheet...")
-    added = add_clients(new_clients)
-    print(f"✓ Added {added} new clients to sheet")
+    if not new_clients:
+        if not existing_clients or new_only:
+            print("Sheet is up to date.")
+        return True
     
     print(f"\n{'='*60}")
     print("Sync complete!")
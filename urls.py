@@ -0,0 +1,84 @@
+"""
+Google Maps link helpers (short-link expansion, place coordinates) shared by
+the web app, the route optimizer CLI and the Sheets module.
+Kept free of gspread and Flask so every entry point can import it cheaply.
+"""
+
+import re
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import cache_get, cache_set
+
+# Short links (goo.gl, maps.app.goo.gl) that need a redirect to get coordinates;
+# anchored at the host so long Maps URLs are rejected after a few characters
+SHORT_URL_RE = re.compile(r"^(?:https?://)?(?:www\.|maps\.app\.)?goo\.gl/", re.IGNORECASE)
+
+# Place pin coordinates: !3d (lat) and !4d (lng) sit next to each other in one
+# data block, usually in that order; the @lat,lng map center is the fallback.
+# Place pin and map center share one pass over the URL
+PLACE_OR_AT_RE = re.compile(
+    r"!3d(?P<place_lat>-?\d+\.?\d*)!4d(?P<place_lng>-?\d+\.?\d*)"
+    r"|!4d(?P<swapped_lng>-?\d+\.?\d*)!3d(?P<swapped_lat>-?\d+\.?\d*)"
+    r"|@(?P<at_lat>-?\d+\.?\d*),(?P<at_lng>-?\d+\.?\d*)"
+)
+
+# Expanded short links are also kept in the persistent "short_urls" cache namespace
+SHORT_URL_TTL = 30 * 24 * 3600  # seconds
+
+# One HTTP client for every link expansion, sized for the web app's
+# GEOCODE_POOL fan-out; transient errors are retried (HEAD is idempotent)
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504])
+))
+
+
+def follow_short_url(url: str) -> str:
+    """
+    Follow a short link's redirects to the final Google Maps URL.
+    Intermediate hops (consent pages, ?cid= place links) often carry no
+    coordinates, so the whole chain is followed.
+    Raises requests.RequestException on network errors.
+    """
+    response = HTTP_SESSION.head(url, allow_redirects=True, timeout=10)
+    return response.url
+
+
+@lru_cache(maxsize=4096)
+def resolve_short_url(url: str) -> str:
+    """
+    Follow a short link's redirects, using the persistent cache when possible.
+    Raises on network errors so failures are not cached.
+    """
+    expanded = cache_get("short_urls", url)
+    if expanded:
+        return expanded
+    
+    expanded = follow_short_url(url)
+    cache_set("short_urls", url, expanded, ttl=SHORT_URL_TTL)
+    return expanded
+
+
+def find_place_or_center(url: str) -> tuple[float, float] | None:
+    """
+    Get the place pin (!3d/!4d) coordinates from a full Maps URL, or the @
+    map center when there is no pin. The center usually appears earlier in
+    the URL, so scanning continues past it looking for a pin.
+    """
+    at_match = None
+    for match in PLACE_OR_AT_RE.finditer(url):
+        if match["place_lat"]:
+            return float(match["place_lat"]), float(match["place_lng"])
+        if match["swapped_lat"]:
+            return float(match["swapped_lat"]), float(match["swapped_lng"])
+        if at_match is None:
+            at_match = match
+    if at_match:
+        return float(at_match["at_lat"]), float(at_match["at_lng"])
+    return None